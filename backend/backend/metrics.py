@@ -0,0 +1,191 @@
+"""
+In-process request and pipeline metrics in the Prometheus text format.
+
+MetricsMiddleware times every view; @instrument('stage') times a
+pipeline stage. Both record wall time, number of DB queries and DB time.
+Metrics are per process and served by metrics_view at /metrics.
+"""
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+from django.http import HttpResponse
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+
+class Histogram:
+    """Cumulative histogram with one series per label combination"""
+
+    def __init__(self, name: str, documentation: str, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def collect(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+            for key, values in series:
+                labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+                bounds = [*(str(bound) for bound in self.buckets), '+Inf']
+                counts = [*values['buckets'], values['count']]
+                for bound, count in zip(bounds, counts):
+                    le = 'le="' + bound + '"'
+                    lines.append(f"{self.name}_bucket{_labels([*labels, le])} {count}")
+                lines.append(f"{self.name}_sum{_labels(labels)} {values['sum']}")
+                lines.append(f"{self.name}_count{_labels(labels)} {values['count']}")
+        return lines
+
+
+def _labels(pairs) -> str:
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram(
+    'skyguard_request_duration_seconds', "Wall time of HTTP requests per view",
+    ('view', 'method', 'status'), DURATION_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    'skyguard_request_db_queries', "DB queries per HTTP request",
+    ('view', 'method'), QUERY_BUCKETS,
+)
+REQUEST_DB_TIME = Histogram(
+    'skyguard_request_db_seconds', "Time spent in DB queries per HTTP request",
+    ('view', 'method'), DURATION_BUCKETS,
+)
+STAGE_DURATION = Histogram(
+    'skyguard_stage_duration_seconds', "Wall time of alerting pipeline stages",
+    ('stage',), DURATION_BUCKETS,
+)
+STAGE_QUERIES = Histogram(
+    'skyguard_stage_db_queries', "DB queries per alerting pipeline stage",
+    ('stage',), QUERY_BUCKETS,
+)
+STAGE_DB_TIME = Histogram(
+    'skyguard_stage_db_seconds', "Time spent in DB queries per alerting pipeline stage",
+    ('stage',), DURATION_BUCKETS,
+)
+
+REGISTRY = [REQUEST_DURATION, REQUEST_QUERIES, REQUEST_DB_TIME, STAGE_DURATION, STAGE_QUERIES, STAGE_DB_TIME]
+
+
+class QueryTimer:
+    """connection.execute_wrapper() callback counting queries and their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+@contextmanager
+def measure():
+    """Yield a QueryTimer; its 'elapsed' is set to the wall time on exit"""
+    timer = QueryTimer()
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(timer):
+            yield timer
+    finally:
+        timer.elapsed = time.perf_counter() - start
+
+
+def instrument(stage: str):
+    """Record wall time, query count and DB time of every call"""
+    def decorator(func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            timer = None
+            try:
+                with measure() as timer:
+                    return func(*args, **kwargs)
+            finally:
+                if timer is not None:
+                    STAGE_DURATION.observe(timer.elapsed, stage=stage)
+                    STAGE_QUERIES.observe(timer.count, stage=stage)
+                    STAGE_DB_TIME.observe(timer.seconds, stage=stage)
+        return timed
+    return decorator
+
+
+def view_name(request) -> str:
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    view_class = getattr(match.func, 'view_class', None) or getattr(match.func, 'cls', None)
+    if view_class is not None:
+        return view_class.__name__
+    return match.view_name or getattr(match.func, '__name__', 'unknown')
+
+
+class MetricsMiddleware:
+    """
+    Records duration, query count and DB time of every request per view.
+    For async views (the SSE stream) only the time to the first byte of
+    the response is recorded.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = None
+        with measure() as timer:
+            response = self.get_response(request)
+        view = view_name(request)
+        REQUEST_DURATION.observe(timer.elapsed, view=view, method=request.method, status=response.status_code)
+        REQUEST_QUERIES.observe(timer.count, view=view, method=request.method)
+        REQUEST_DB_TIME.observe(timer.seconds, view=view, method=request.method)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        REQUEST_DURATION.observe(
+            time.perf_counter() - start, view=view_name(request), method=request.method, status=response.status_code
+        )
+        return response
+
+
+def metrics_view(request):
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
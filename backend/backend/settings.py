@@ -11,9 +11,32 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 DEBUG = os.getenv("DEBUG") == "True"
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+# Outbound delivery limits (Telegram allows ~30 msg/s per bot, ~1 msg/s per chat).
+# The per-bot rate is shared by all workers only with CACHE_REDIS_URL; with the
+# local-memory cache every process may send this many.
+TELEGRAM_MAX_IN_FLIGHT = int(os.getenv("TELEGRAM_MAX_IN_FLIGHT", "20"))
+TELEGRAM_MESSAGES_PER_SECOND = float(os.getenv("TELEGRAM_MESSAGES_PER_SECOND", "30"))
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", "1.0"))
+# Threat alerts to the same chat within this many seconds are sent as one digest
+ALERT_COALESCE_SECONDS = float(os.getenv("ALERT_COALESCE_SECONDS", "2"))
+# Time allowed for assigning the recipients of one threat to shelters
+SHELTER_ASSIGNMENT_BUDGET = float(os.getenv("SHELTER_ASSIGNMENT_BUDGET", "0.5"))
+# Location updates closer than this to the last one are dropped, the rest
+# are buffered and written to the profiles every LOCATION_FLUSH_SECONDS
+# (with a shared cache; a per-process one writes every move straight
+# through, see users.locations)
+LOCATION_MIN_MOVE_METERS = float(os.getenv("LOCATION_MIN_MOVE_METERS", "50"))
+LOCATION_FLUSH_SECONDS = float(os.getenv("LOCATION_FLUSH_SECONDS", "10"))
 
 ALLOWED_HOSTS = ['*']
 
+# Live target feed (targets/stream/). The in-process broker only reaches
+# streams served by the same process; set TARGET_EVENTS_BROKER to
+# "targets.events.RedisBroker" when running several processes.
+TARGET_EVENTS_BROKER = os.getenv("TARGET_EVENTS_BROKER", "targets.events.InProcessBroker")
+TARGET_EVENTS_REDIS_URL = os.getenv("TARGET_EVENTS_REDIS_URL", "redis://localhost:6379/0")
+
 INSTALLED_APPS = [
     'jazzmin',
     'django_admin_geomap',
@@ -31,6 +54,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -43,6 +67,30 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'backend.urls'
 
+# LOG_FORMAT=json writes one JSON object per line, with the fields passed
+# to the logger in extra={}
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'text': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+        'json': {'()': 'backend.log.JsonFormatter'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'text',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': LOG_LEVEL,
+    },
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -71,6 +119,23 @@ DATABASES = {
     }
 }
 
+# Shared cache for versioned list responses. The local-memory fallback is
+# per process; set CACHE_REDIS_URL when running several workers.
+if os.getenv('CACHE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'skyguard',
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -110,6 +175,10 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_THROTTLE_RATES': {
+        # Public, unauthenticated shelter lookups per client IP
+        'shelters_nearest': os.getenv('SHELTERS_NEAREST_RATE', '120/min'),
+    },
 }
 
 JAZZMIN_SETTINGS = {
@@ -1,8 +1,14 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.contrib import messages
-from .models import Target, Shelter
-from .forms import ShelterAdminForm, TargetAdminForm
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count
+from django.http import Http404, StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
+from .datasets import CONTENT_TYPES, FORMATS, InvalidRecord, detect_format, export_shelters, import_batches, text_stream
+from .models import Target, Shelter, NotificationJob, AlertDelivery, Region, ThreatCounter
+from .forms import ShelterAdminForm, ShelterImportForm, TargetAdminForm
 
 
 @admin.register(Target)
@@ -11,7 +17,7 @@ class TargetAdmin(admin.ModelAdmin):
     list_display = ('title', 'type_badge', 'status_badge', 'probability_badge', 'danger_radius_display', 'author_with_rating', 'report_count', 'created_at')
     list_filter = ('status', 'target_type', 'probability', 'danger_radius', 'created_at')
     search_fields = ('title', 'description', 'author__username')
-    readonly_fields = ('created_at', 'resolved_at', 'report_count', 'weighted_score', 'probability', 'child_reports_list')
+    readonly_fields = ('created_at', 'resolved_at', 'report_count', 'weighted_score', 'probability', 'alert_timing', 'child_reports_list')
     actions = ['confirm_targets', 'reject_targets']
 
     fieldsets = (
@@ -23,7 +29,7 @@ class TargetAdmin(admin.ModelAdmin):
             "description": "Click on map or enter manually"
         }),
         ("Statistics", {
-            "fields": ("probability", "report_count", "weighted_score"),
+            "fields": ("probability", "report_count", "weighted_score", "alert_timing"),
         }),
         ("Related Reports", {
             "fields": ("child_reports_list",),
@@ -96,6 +102,19 @@ class TargetAdmin(admin.ModelAdmin):
         return obj.author.username
     author_with_rating.short_description = "Author"
 
+    def alert_timing(self, obj):
+        from .coalescing import alert_timings
+        timing = alert_timings([obj.pk]).get(obj.pk)
+        if not timing:
+            return "No alerts"
+        first, last = timing['time_to_first_alert'], timing['time_to_last_alert']
+        return "First after {}, last after {} ({}/{} sent)".format(
+            f"{first.total_seconds():.1f} s" if first else "-",
+            f"{last.total_seconds():.1f} s" if last else "-",
+            timing['sent'], timing['recipients'],
+        )
+    alert_timing.short_description = "Alert delivery"
+
     def child_reports_list(self, obj):
         children = Target.objects.filter(parent_target=obj)
         if not children:
@@ -139,18 +158,12 @@ class TargetAdmin(admin.ModelAdmin):
 
     @admin.action(description="✅ Confirm selected targets")
     def confirm_targets(self, request, queryset):
-        count = 0
-        for target in queryset.filter(status='unconfirmed'):
-            target.confirm()
-            count += 1
+        count = Target.resolve_many(queryset, 'confirmed')
         self.message_user(request, f"{count} target(s) confirmed. Users rewarded with +0.25 rating.", messages.SUCCESS)
 
     @admin.action(description="❌ Reject selected targets (false alarm)")
     def reject_targets(self, request, queryset):
-        count = 0
-        for target in queryset.filter(status='unconfirmed'):
-            target.reject()
-            count += 1
+        count = Target.resolve_many(queryset, 'rejected')
         self.message_user(request, f"{count} target(s) rejected. Users penalized with -0.25 rating.", messages.WARNING)
 
 
@@ -158,11 +171,11 @@ class TargetAdmin(admin.ModelAdmin):
 class ShelterAdmin(admin.ModelAdmin):
     form = ShelterAdminForm
     list_display = ('title', 'capacity', 'coordinates')
-    search_fields = ('title', 'address')
+    search_fields = ('title', 'address', 'external_id')
 
     fieldsets = (
         ("Info", {
-            "fields": ("title", "address", "capacity")
+            "fields": ("title", "address", "capacity", "external_id")
         }),
         ("Location", {
             "fields": ("map_picker", "latitude", "longitude"),
@@ -171,4 +184,89 @@ class ShelterAdmin(admin.ModelAdmin):
     )
 
     def coordinates(self, obj):
-        return f"{obj.latitude:.4f}, {obj.longitude:.4f}"
\ No newline at end of file
+        return f"{obj.latitude:.4f}, {obj.longitude:.4f}"
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='targets_shelter_import'),
+            path('export/', self.admin_site.admin_view(self.export_view), name='targets_shelter_export'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        """Upload form; a valid upload is answered with streamed progress lines"""
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+        form = ShelterImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                fmt = form.cleaned_data['format'] or detect_format(upload.name)
+            except ValueError as e:
+                form.add_error('format', str(e))
+            else:
+                return StreamingHttpResponse(
+                    self.import_progress(upload, fmt), content_type='text/plain; charset=utf-8'
+                )
+        context = {
+            **self.admin_site.each_context(request),
+            'title': "Import shelters",
+            'opts': self.model._meta,
+            'form': form,
+        }
+        return TemplateResponse(request, 'admin/targets/shelter/import.html', context)
+
+    def import_progress(self, upload, fmt):
+        yield f"Importing {upload.name} as {fmt}\n"
+        result = None
+        try:
+            for result in import_batches(text_stream(upload.file), fmt):
+                yield f"{result}\n"
+        except (InvalidRecord, UnicodeDecodeError) as e:
+            yield f"Stopped: {e}\n"
+        if result is not None:
+            yield "".join(f"{error}\n" for error in result.errors)
+        yield "Done\n"
+
+    def export_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in FORMATS:
+            raise Http404(f"Unknown format {fmt}")
+        response = StreamingHttpResponse(export_shelters(fmt), content_type=CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="shelters.{fmt}"'
+        return response
+
+
+@admin.register(NotificationJob)
+class NotificationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'target', 'scope', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('kind', 'target', 'scope', 'attempts', 'last_error', 'created_at', 'available_at', 'locked_at', 'finished_at')
+
+
+@admin.register(AlertDelivery)
+class AlertDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'chat_id', 'target', 'distance', 'priority', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('chat_id',)
+    readonly_fields = ('chat_id', 'target', 'distance', 'priority', 'shelter', 'shelter_distance', 'attempts', 'created_at', 'due_at', 'locked_at', 'sent_at')
+
+
+@admin.register(Region)
+class RegionAdmin(admin.ModelAdmin):
+    list_display = ('code', 'name', 'subscribers', 'active_threats')
+    search_fields = ('code', 'name')
+    readonly_fields = ('code',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(subscriber_count=Count('memberships'))
+
+    def subscribers(self, obj):
+        return obj.subscriber_count
+    subscribers.short_description = "Subscribers"
+    subscribers.admin_order_field = 'subscriber_count'
+
+    def active_threats(self, obj):
+        return ThreatCounter.active_count(obj.code)
+    active_threats.short_description = "Active threats"
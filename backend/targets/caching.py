@@ -0,0 +1,100 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from rest_framework import status
+
+# Backends whose entries other processes cannot see
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def is_shared_cache() -> bool:
+    """Whether the default cache is shared by all processes (e.g. Redis)"""
+    return not isinstance(caches['default'], PROCESS_LOCAL_CACHES)
+
+
+def _version_key(scope: str) -> str:
+    return f"map:version:{scope}"
+
+
+def get_version(scope: str) -> int:
+    """
+    Current data version of a cache scope ("targets", "shelters").
+    A missing counter starts from the current time in milliseconds so
+    versions are not reused after the cache has been flushed.
+    """
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(scope: str) -> int:
+    """Invalidate every cached response of the scope and return the new version"""
+    key = _version_key(scope)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), None)
+        return cache.get(key)
+
+
+class VersionedCacheMixin:
+    """
+    Caches rendered list responses per data version and query string and
+    answers If-None-Match with 304 while the version is unchanged. The
+    version is bumped by the post_save/post_delete receivers, so neither
+    a cache hit nor a 304 touches the database.
+    """
+    cache_scope = None
+    cache_timeout = 300
+
+    def list(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if renderer.format == 'api':
+            return super().list(request, *args, **kwargs)
+
+        # Read the version before the data so a concurrent write can only
+        # make a cached body newer than its version, never older
+        version = get_version(self.cache_scope)
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        tag = hashlib.md5(
+            f"{self.cache_scope}:{version}:{renderer.format}:{request.path}:{query}".encode()
+        ).hexdigest()
+        etag = f'"{tag}"'
+
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            return self._cached_response(b'', None, etag, status.HTTP_304_NOT_MODIFIED)
+
+        cache_key = f"map:body:{tag}"
+        cached = cache.get(cache_key)
+        if cached is None:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content_type = renderer.media_type
+            if renderer.charset:
+                content_type = f"{content_type}; charset={renderer.charset}"
+            # Renderers may relabel the response, e.g. for a JSON fallback
+            response['Content-Type'] = content_type
+            context = {**self.get_renderer_context(), 'response': response}
+            body = renderer.render(response.data, request.accepted_media_type, context)
+            cached = (body, response['Content-Type'])
+            cache.set(cache_key, cached, self.cache_timeout)
+
+        return self._cached_response(*cached, etag)
+
+    @staticmethod
+    def _cached_response(body, content_type, etag, status_code=status.HTTP_200_OK):
+        response = HttpResponse(body, content_type=content_type, status=status_code)
+        if status_code == status.HTTP_304_NOT_MODIFIED:
+            del response['Content-Type']
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
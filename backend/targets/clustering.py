@@ -0,0 +1,135 @@
+import heapq
+import math
+import threading
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .geo import bounding_box
+
+AGGREGATION_RADIUS_KM = 2
+AGGREGATION_WINDOW = timedelta(hours=2)
+MIN_CLUSTER_AUTHORS = 5
+
+# Cell size of the spatial hash in degrees (~5.5 km north-south)
+INDEX_CELL_DEG = 0.05
+
+# A cluster's centroid is the mean of reports within AGGREGATION_RADIUS_KM
+# of its first report, so it can drift that far from the indexed position
+# when another process promotes it. Searching with this margin keeps the
+# candidate set a superset of the true neighbours.
+CENTROID_MARGIN_KM = AGGREGATION_RADIUS_KM
+
+# Rows committed by other processes can show up slightly out of order,
+# so every sync re-reads this much of the recent past
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+class ClusterIndex:
+    """
+    In-memory spatial hash of recent targets, bucketed per target_type.
+
+    The index only narrows the search: it returns the pks of targets that
+    may lie within the aggregation radius, and Target.find_aggregation()
+    re-applies the status/parent/time filters in the database. Entries
+    are evicted once they fall out of the aggregation window, and rows
+    written by other processes are picked up by a cheap created_at sync
+    before every lookup.
+    """
+
+    def __init__(self, window=AGGREGATION_WINDOW, cell_deg=INDEX_CELL_DEG):
+        self.window = window
+        self.cell_deg = cell_deg
+        self._lock = threading.Lock()
+        self._cells = {}
+        self._entries = {}
+        self._expiry = []
+        self._synced_at = None
+
+    def _cell(self, target_type, latitude, longitude):
+        return (
+            target_type,
+            math.floor(latitude / self.cell_deg),
+            math.floor(longitude / self.cell_deg),
+        )
+
+    def _add(self, pk, target_type, latitude, longitude, created_at):
+        entry = self._entries.get(pk)
+        if entry is not None:
+            self._cells[entry[0]].discard(pk)
+        cell = self._cell(target_type, latitude, longitude)
+        self._cells.setdefault(cell, set()).add(pk)
+        self._entries[pk] = (cell, created_at)
+        if entry is None:
+            heapq.heappush(self._expiry, (created_at, pk))
+
+    def _remove(self, pk):
+        entry = self._entries.pop(pk, None)
+        if entry is not None:
+            cell_entries = self._cells.get(entry[0])
+            cell_entries.discard(pk)
+            if not cell_entries:
+                del self._cells[entry[0]]
+
+    def _evict(self, now):
+        cutoff = now - self.window
+        while self._expiry and self._expiry[0][0] < cutoff:
+            created_at, pk = heapq.heappop(self._expiry)
+            self._remove(pk)
+
+    def _sync(self, now):
+        from .models import Target
+
+        since = now - self.window
+        if self._synced_at is not None:
+            since = max(since, self._synced_at - SYNC_OVERLAP)
+        rows = Target.objects.filter(created_at__gte=since).values_list(
+            'pk', 'target_type', 'latitude', 'longitude', 'created_at'
+        )
+        for row in rows:
+            self._add(*row)
+        self._synced_at = now
+
+    def observe(self, target):
+        """Add or move a target after it has been saved in this process"""
+        if target.pk is None or target.created_at is None:
+            return
+        with self._lock:
+            if target.created_at >= timezone.now() - self.window:
+                self._add(target.pk, target.target_type, target.latitude, target.longitude, target.created_at)
+
+    def forget(self, pk):
+        with self._lock:
+            self._remove(pk)
+
+    def candidates(self, target, radius_km=AGGREGATION_RADIUS_KM) -> list:
+        """
+        Return pks of recent targets of the same type that may lie within
+        radius_km of the given target (excluding the target itself).
+        """
+        now = timezone.now()
+        min_lat, max_lat, min_lon, max_lon = bounding_box(
+            target.latitude, target.longitude, radius_km + CENTROID_MARGIN_KM
+        )
+        first = self._cell(target.target_type, min_lat, min_lon)
+        last = self._cell(target.target_type, max_lat, max_lon)
+
+        with self._lock:
+            self._sync(now)
+            self._evict(now)
+            found = []
+            for row in range(first[1], last[1] + 1):
+                for col in range(first[2], last[2] + 1):
+                    found.extend(self._cells.get((target.target_type, row, col), ()))
+
+        return [pk for pk in found if pk != target.pk]
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._entries.clear()
+            self._expiry.clear()
+            self._synced_at = None
+
+
+cluster_index = ClusterIndex()
@@ -0,0 +1,230 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Min, Q, Value, When
+from django.utils import timezone
+
+from backend.metrics import instrument
+from .models import AlertDelivery, NotificationJob, Target
+
+# Sent and failed alerts are kept this long to suppress repeats
+RETENTION = timedelta(days=1)
+# Expired alerts are deleted by an idle poll at most this often, in seconds
+CLEANUP_INTERVAL = 600
+CLEANUP_DUE_KEY = 'alerts:cleanup-due'
+STALE_LOCK_TIMEOUT = timedelta(minutes=10)
+MAX_ATTEMPTS = 5
+
+# How much more urgent one threat is than another at the same distance
+TYPE_SEVERITY = {
+    'rocket': 3.0,
+    'plane': 2.0,
+    'helicopter': 1.5,
+    'bang': 1.5,
+    'drone': 1.0,
+}
+PROBABILITY_WEIGHT = {'high': 1.5, 'medium': 1.2, 'low': 1.0}
+# Added for recipients inside the danger radius, so they always come
+# before everyone outside it
+DANGER_ZONE_PRIORITY = 1000.0
+
+
+def coalesce_window() -> timedelta:
+    """How long an alert waits for others to the same chat"""
+    return timedelta(seconds=getattr(settings, 'ALERT_COALESCE_SECONDS', 2))
+
+
+def alert_priority(target, distance: float) -> float:
+    """
+    Higher is sent sooner. Grows with the threat's severity and
+    probability and as the distance shrinks relative to danger_radius.
+    """
+    ratio = max(distance / max(target.danger_radius, 1), 0.05)
+    urgency = TYPE_SEVERITY.get(target.target_type, 1.0) * PROBABILITY_WEIGHT.get(target.probability, 1.0) / ratio
+    return urgency + DANGER_ZONE_PRIORITY if ratio <= 1 else urgency
+
+
+def buffer_alerts(target, recipients, shelters=None) -> int:
+    """
+    Queue alerts about target for (chat_id, distance) recipients, with
+    the shelter suggested to each chat from shelters, a dict of chat_id
+    to (shelter pk, distance km).
+    Chats that were already alerted about it are skipped. Recipients
+    inside the danger radius are due at once, everyone else waits for
+    the coalescing window.
+    Returns the number of alerts queued.
+    """
+    recipients = dict(recipients)
+    shelters = shelters or {}
+    if not recipients:
+        return 0
+    already = set(
+        AlertDelivery.objects.filter(target=target, chat_id__in=recipients).values_list('chat_id', flat=True)
+    )
+    now = timezone.now()
+    alerts = []
+    for chat_id, distance in recipients.items():
+        if chat_id in already:
+            continue
+        priority = alert_priority(target, distance)
+        shelter_id, shelter_distance = shelters.get(chat_id, (None, None))
+        alerts.append(AlertDelivery(
+            chat_id=chat_id,
+            target=target,
+            distance=distance,
+            priority=priority,
+            shelter_id=shelter_id,
+            shelter_distance=shelter_distance,
+            due_at=now if priority >= DANGER_ZONE_PRIORITY else now + coalesce_window(),
+        ))
+    # A concurrent job for the same target may insert first
+    AlertDelivery.objects.bulk_create(alerts, ignore_conflicts=True)
+    return len(alerts)
+
+
+def claim_alerts(max_chats: int = 500) -> list:
+    """
+    Lock and mark as processing every waiting alert of up to max_chats
+    chats whose oldest alert is due, most urgent chats first. Rows locked
+    by other workers are skipped. Alerts about targets that stopped being
+    a threat while they waited are marked failed instead.
+    """
+    now = timezone.now()
+    claimable = Q(status='pending') | Q(status='processing', locked_at__lt=now - STALE_LOCK_TIMEOUT)
+    with transaction.atomic():
+        due = AlertDelivery.objects.select_for_update(skip_locked=True).filter(
+            claimable, due_at__lte=now
+        ).order_by('-priority', 'due_at').values_list('chat_id', flat=True)
+        chats = set()
+        for chat_id in due.iterator():
+            chats.add(chat_id)
+            if len(chats) >= max_chats:
+                break
+        if not chats:
+            return []
+
+        waiting = AlertDelivery.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+            claimable, chat_id__in=chats
+        )
+        active = Q(target__status__in=Target.ACTIVE_STATUSES, target__parent_target__isnull=True)
+        # Rejected or merged threats are never sent, also not after the all-clear
+        AlertDelivery.objects.filter(
+            pk__in=list(waiting.exclude(active).values_list('pk', flat=True))
+        ).update(status='failed', locked_at=None)
+        alerts = list(waiting.filter(active).select_related('target', 'shelter'))
+        AlertDelivery.objects.filter(pk__in=[alert.pk for alert in alerts]).update(
+            status='processing', locked_at=now, attempts=F('attempts') + 1
+        )
+    return alerts
+
+
+@instrument('flush_alerts')
+def flush_alerts(max_chats: int = 500) -> int:
+    """
+    Send one digest per chat for due alerts and record the outcome.
+    Chats are sent in order of their most urgent alert, which is also
+    listed first in the digest. Failed chats are retried with
+    exponential backoff up to MAX_ATTEMPTS.
+    Returns the number of messages sent.
+    """
+    from .dispatch import get_dispatcher
+    from .notifications import digest_message
+
+    alerts = claim_alerts(max_chats)
+    if not alerts:
+        delete_expired_alerts()
+        return 0
+
+    by_chat = defaultdict(list)
+    for alert in sorted(alerts, key=lambda alert: -alert.priority):
+        by_chat[alert.chat_id].append(alert)
+
+    results = get_dispatcher().send_many(
+        (chat_id, digest_message(
+            [(alert.target, alert.distance) for alert in chat_alerts],
+            next(((alert.shelter, alert.shelter_distance) for alert in chat_alerts if alert.shelter), None),
+        ))
+        for chat_id, chat_alerts in by_chat.items()
+    )
+
+    now = timezone.now()
+    sent, retry, failed = {}, defaultdict(list), []
+    for result, chat_alerts in zip(results, by_chat.values()):
+        if result.ok:
+            sent[result.chat_id] = datetime.fromtimestamp(result.sent_at, dt_timezone.utc)
+            continue
+        for alert in chat_alerts:
+            attempts = alert.attempts + 1
+            if attempts >= MAX_ATTEMPTS:
+                failed.append(alert.pk)
+            else:
+                retry[attempts].append(alert.pk)
+
+    if sent:
+        # Keep each chat's own send time for the alert_timings() metrics
+        AlertDelivery.objects.filter(
+            pk__in=[alert.pk for alert in alerts if alert.chat_id in sent]
+        ).update(
+            status='sent',
+            locked_at=None,
+            sent_at=Case(*[When(chat_id=chat_id, then=Value(sent_at)) for chat_id, sent_at in sent.items()]),
+        )
+    AlertDelivery.objects.filter(pk__in=failed).update(status='failed', locked_at=None)
+    for attempts, pks in retry.items():
+        AlertDelivery.objects.filter(pk__in=pks).update(
+            status='pending', locked_at=None, due_at=now + timedelta(seconds=2 ** attempts)
+        )
+    return sum(1 for result in results if result.ok)
+
+
+def delete_expired_alerts() -> int:
+    """
+    Delete sent and failed alerts older than RETENTION, if no process
+    did in the last CLEANUP_INTERVAL seconds. Returns the number deleted.
+    """
+    if not cache.add(CLEANUP_DUE_KEY, 1, CLEANUP_INTERVAL):
+        return 0
+    deleted, _ = AlertDelivery.objects.filter(
+        status__in=['sent', 'failed'], created_at__lt=timezone.now() - RETENTION
+    ).delete()
+    return deleted
+
+
+def has_waiting_alerts() -> bool:
+    return AlertDelivery.objects.filter(status__in=['pending', 'processing']).exists()
+
+
+def alert_timings(target_ids) -> dict:
+    """
+    Delivery metrics per target id: how long after the threat alert was
+    queued the first and the last message went out (None until sent),
+    and how many of the recipients were reached.
+    """
+    raised = dict(
+        NotificationJob.objects.filter(kind='threat', target_id__in=target_ids)
+        .values('target_id').annotate(raised_at=Min('created_at'))
+        .values_list('target_id', 'raised_at')
+    )
+    rows = (
+        AlertDelivery.objects.filter(target_id__in=target_ids)
+        .values('target_id')
+        .annotate(
+            first_sent_at=Min('sent_at'),
+            last_sent_at=Max('sent_at'),
+            recipients=Count('pk'),
+            sent=Count('pk', filter=Q(status='sent')),
+        )
+    )
+    timings = {}
+    for row in rows:
+        start = raised.get(row['target_id'])
+        timings[row['target_id']] = {
+            'time_to_first_alert': row['first_sent_at'] - start if start and row['first_sent_at'] else None,
+            'time_to_last_alert': row['last_sent_at'] - start if start and row['last_sent_at'] else None,
+            'recipients': row['recipients'],
+            'sent': row['sent'],
+        }
+    return timings
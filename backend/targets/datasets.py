@@ -0,0 +1,386 @@
+"""
+Streaming import and export of shelter datasets as CSV, GeoJSON
+(a FeatureCollection of Points) or NDJSON (one JSON object per line).
+
+Files are read record by record and written in batches, so memory use
+does not grow with the file size. Records are matched to existing
+shelters by external_id; exports write every shelter's external_id
+(generated for shelters added in the admin), so re-importing an export
+updates the same rows. The primary key "id" is not an identifier.
+"""
+import csv
+import io
+import json
+import math
+import re
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+FORMATS = ('csv', 'geojson', 'ndjson')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'geojson': 'application/geo+json',
+    'ndjson': 'application/x-ndjson',
+}
+
+IMPORT_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 64 * 1024
+# Longest GeoJSON feature read before the file is given up as malformed
+MAX_FEATURE_SIZE = 1024 * 1024
+# Invalid records listed in an ImportResult, the rest are only counted
+MAX_REPORTED_ERRORS = 50
+
+# Accepted names of each column or property
+FIELD_ALIASES = {
+    'external_id': ('external_id', 'ref'),
+    'title': ('title', 'name'),
+    'address': ('address', 'addr'),
+    'capacity': ('capacity', 'places'),
+    'latitude': ('latitude', 'lat'),
+    'longitude': ('longitude', 'lon', 'lng'),
+}
+UPDATED_FIELDS = ['title', 'address', 'capacity', 'latitude', 'longitude']
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    read: int = 0
+    upserted: int = 0
+    skipped: int = 0
+    errors: list = field(default_factory=list)
+
+    def __str__(self):
+        return f"{self.read} read, {self.upserted} imported, {self.skipped} skipped"
+
+
+def detect_format(filename: str) -> str:
+    extension = filename.rsplit('.', 1)[-1].lower()
+    if extension in ('json', 'geojson'):
+        return 'geojson'
+    if extension in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    if extension == 'csv':
+        return 'csv'
+    raise ValueError(f"Cannot tell the format of {filename!r}, expected one of {', '.join(FORMATS)}")
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def read_ndjson(stream):
+    """Objects of each non-empty line; broken lines yield an InvalidRecord"""
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield InvalidRecord(f"line {number}: {e.msg}")
+
+
+FEATURES_START = re.compile(r'"features"\s*:\s*\[')
+
+
+def _element_end(text: str, start: int):
+    """
+    Index of the ',' or ']' ending the JSON array element that starts at
+    start, or None when the text ends first
+    """
+    depth = 0
+    in_string = escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            if not depth:
+                return index
+            depth -= 1
+        elif char == ',' and not depth:
+            return index
+    return None
+
+
+def read_geojson(stream):
+    """
+    Features of a FeatureCollection, decoded one at a time from the
+    "features" array without reading the whole file. Malformed features
+    are yielded as an InvalidRecord and skipped.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+
+    def more():
+        nonlocal buffer, eof
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if chunk:
+            buffer += chunk
+        else:
+            eof = True
+
+    while True:
+        match = FEATURES_START.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        if eof:
+            raise InvalidRecord('No "features" array found')
+        # Keep a tail in case the key is split between chunks
+        buffer = buffer[-32:]
+        more()
+
+    position = 0
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position == len(buffer):
+            if eof:
+                raise InvalidRecord('Unterminated "features" array')
+            buffer = ''
+            position = 0
+            more()
+            continue
+        if buffer[position] == ']':
+            return
+        try:
+            feature, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            # Either the feature continues in the next chunk, or it is
+            # malformed and ends at the next top-level delimiter
+            end = _element_end(buffer, position)
+            if end is None:
+                if eof:
+                    raise InvalidRecord(f"Invalid feature: {e.msg}")
+                if len(buffer) - position > MAX_FEATURE_SIZE:
+                    raise InvalidRecord("Feature too large or not terminated")
+                buffer = buffer[position:]
+                position = 0
+                more()
+                continue
+            yield InvalidRecord(f"Invalid feature: {e.msg}")
+            position = max(end, position + 1)
+            continue
+        yield feature
+        position = end
+
+
+def feature_record(feature) -> dict:
+    if not isinstance(feature, dict):
+        raise InvalidRecord("Expected a Feature object")
+    geometry = feature.get('geometry') or {}
+    if geometry.get('type') != 'Point':
+        raise InvalidRecord("Only Point geometries are supported")
+    coordinates = geometry.get('coordinates') or []
+    if len(coordinates) < 2:
+        raise InvalidRecord("Point without coordinates")
+    record = dict(feature.get('properties') or {})
+    if feature.get('id') is not None:
+        record.setdefault('external_id', feature['id'])
+    record['longitude'], record['latitude'] = coordinates[:2]
+    return record
+
+
+READERS = {'csv': read_csv, 'geojson': read_geojson, 'ndjson': read_ndjson}
+
+
+def _value(record: dict, name: str):
+    for alias in FIELD_ALIASES[name]:
+        value = record.get(alias)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _coordinate(record: dict, name: str, limit: float) -> float:
+    value = _value(record, name)
+    if value is None:
+        raise InvalidRecord(f"Missing {name}")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise InvalidRecord(f"Invalid {name} {value!r}")
+    if not math.isfinite(value) or not -limit <= value <= limit:
+        raise InvalidRecord(f"{name} {value} out of range")
+    return value
+
+
+def clean_record(record) -> dict:
+    """Shelter field values of one record; raises InvalidRecord"""
+    from .models import Shelter
+
+    if not isinstance(record, dict):
+        raise InvalidRecord("Expected an object")
+    latitude = _coordinate(record, 'latitude', 90)
+    longitude = _coordinate(record, 'longitude', 180)
+
+    capacity = _value(record, 'capacity')
+    try:
+        capacity = int(float(capacity)) if capacity is not None else 0
+    except (TypeError, ValueError):
+        raise InvalidRecord(f"Invalid capacity {capacity!r}")
+    if capacity < 0:
+        raise InvalidRecord(f"Negative capacity {capacity}")
+
+    # Datasets without identifiers are matched on the position
+    external_id = _value(record, 'external_id')
+    external_id = str(external_id) if external_id is not None else f"geo:{latitude:.6f},{longitude:.6f}"
+    if len(external_id) > Shelter._meta.get_field('external_id').max_length:
+        raise InvalidRecord(f"external_id {external_id[:20]!r}… too long")
+
+    title_field = Shelter._meta.get_field('title')
+    address_field = Shelter._meta.get_field('address')
+    return {
+        'external_id': external_id,
+        'title': str(_value(record, 'title') or title_field.default)[:title_field.max_length],
+        'address': str(_value(record, 'address') or '')[:address_field.max_length],
+        'capacity': capacity,
+        'latitude': latitude,
+        'longitude': longitude,
+    }
+
+
+def text_stream(binary):
+    """Decode a binary file as UTF-8, dropping a byte order mark"""
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def _write_batch(batch: dict) -> int:
+    from .caching import bump_version
+    from .models import Shelter
+
+    with transaction.atomic():
+        Shelter.objects.bulk_create(
+            [Shelter(**values) for values in batch.values()],
+            update_conflicts=True,
+            unique_fields=['external_id'],
+            update_fields=UPDATED_FIELDS,
+        )
+        # bulk_create() sends no post_save, invalidate caches and the
+        # shelter index directly
+        transaction.on_commit(lambda: bump_version('shelters'))
+    return len(batch)
+
+
+def import_batches(stream, fmt: str, batch_size: int = IMPORT_BATCH_SIZE):
+    """
+    Upsert the shelters of a text stream in batches, yielding the running
+    ImportResult after every batch. Invalid records are skipped and
+    reported in the result.
+    """
+    result = ImportResult()
+    records = READERS[fmt](stream)
+    if fmt == 'geojson':
+        records = map(_feature_or_error, records)
+
+    # Keyed by external_id, a record repeated within one batch would make
+    # the upsert touch the same row twice
+    batch = {}
+    for number, record in enumerate(records, 1):
+        result.read += 1
+        try:
+            if isinstance(record, InvalidRecord):
+                raise record
+            values = clean_record(record)
+        except InvalidRecord as e:
+            result.skipped += 1
+            if len(result.errors) < MAX_REPORTED_ERRORS:
+                result.errors.append(f"Record {number}: {e}")
+            continue
+        batch[values['external_id']] = values
+        if len(batch) >= batch_size:
+            result.upserted += _write_batch(batch)
+            batch = {}
+            yield result
+    if batch:
+        result.upserted += _write_batch(batch)
+    yield result
+
+
+def import_shelters(stream, fmt: str, batch_size: int = IMPORT_BATCH_SIZE, progress=None) -> ImportResult:
+    """import_batches() to the end, calling progress with every result"""
+    result = None
+    for result in import_batches(stream, fmt, batch_size):
+        if progress:
+            progress(result)
+    return result
+
+
+def _feature_or_error(feature):
+    if isinstance(feature, InvalidRecord):
+        return feature
+    try:
+        return feature_record(feature)
+    except InvalidRecord as e:
+        return e
+
+
+def export_shelters(fmt: str, queryset=None, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Yield the shelters serialized with ShelterSerializer as chunks of
+    text in the given format, batch_size shelters at a time.
+    """
+    from .models import Shelter
+    from .serializers import ShelterSerializer
+
+    if queryset is None:
+        queryset = Shelter.objects.all()
+    columns = list(ShelterSerializer().fields)
+
+    def batches():
+        batch = []
+        for shelter in queryset.order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(shelter)
+            if len(batch) >= batch_size:
+                yield ShelterSerializer(batch, many=True).data
+                batch = []
+        if batch:
+            yield ShelterSerializer(batch, many=True).data
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns)
+        writer.writeheader()
+        for rows in batches():
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    elif fmt == 'ndjson':
+        for rows in batches():
+            yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+    elif fmt == 'geojson':
+        yield '{"type": "FeatureCollection", "features": [\n'
+        separator = ''
+        for rows in batches():
+            features = []
+            for row in rows:
+                properties = {key: value for key, value in row.items() if key not in ('latitude', 'longitude')}
+                features.append(json.dumps({
+                    'type': 'Feature',
+                    'id': row.get('external_id'),
+                    'geometry': {'type': 'Point', 'coordinates': [row['longitude'], row['latitude']]},
+                    'properties': properties,
+                }, ensure_ascii=False))
+            yield separator + ',\n'.join(features)
+            separator = ',\n'
+        yield '\n]}\n'
+    else:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(FORMATS)}")
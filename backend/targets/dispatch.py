@@ -0,0 +1,220 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import cache
+
+from backend.metrics import instrument
+from .caching import is_shared_cache
+
+logger = logging.getLogger(__name__)
+
+SENT_KEY = 'telegram:sent:{}'
+PAUSED_KEY = 'telegram:paused-until'
+
+
+@dataclass
+class DeliveryResult:
+    chat_id: str
+    ok: bool
+    status_code: int = None
+    attempts: int = 0
+    error: str = ''
+    # Unix time the message was accepted by Telegram
+    sent_at: float = None
+
+
+class RateLimiter:
+    """
+    Spaces out requests to respect Telegram limits: a global number of
+    messages per second for the bot and a minimum interval per chat.
+    A 429 response pauses every sender until retry_after has passed.
+
+    Each process spaces its own requests. With shared=True, the
+    per-second budget and 429 pauses are also kept in the shared cache,
+    so all workers of the bot together stay within the limit. Chats need
+    no coordination, since a chat's alerts are claimed by one worker.
+    """
+
+    def __init__(self, per_second: float, chat_interval: float, shared: bool = False):
+        self._lock = threading.Lock()
+        self._per_second = per_second
+        self._shared = shared and bool(per_second)
+        self._interval = 1.0 / per_second if per_second else 0.0
+        self._chat_interval = chat_interval
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._chat_next = {}
+
+    def acquire(self, chat_id: str):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot, self._paused_until)
+            self._next_slot = start + self._interval
+            start = max(start, self._chat_next.get(chat_id, 0.0))
+            self._chat_next[chat_id] = start + self._chat_interval
+            if len(self._chat_next) > 10000:
+                self._chat_next = {
+                    key: value for key, value in self._chat_next.items() if value > now
+                }
+        delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+        if self._shared:
+            self._acquire_shared()
+
+    def _acquire_shared(self):
+        """Wait for a slot in the bot's budget for the current second"""
+        while True:
+            now = time.time()
+            paused_until = cache.get(PAUSED_KEY) or 0
+            if paused_until > now:
+                time.sleep(paused_until - now)
+                continue
+            second = int(now)
+            key = SENT_KEY.format(second)
+            cache.add(key, 0, 2)
+            try:
+                sent = cache.incr(key)
+            except ValueError:
+                # Expired between add() and incr()
+                continue
+            if sent <= max(1, int(self._per_second)):
+                return
+            time.sleep(second + 1 - now)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        if self._shared:
+            cache.set(PAUSED_KEY, time.time() + seconds, int(seconds) + 1)
+
+
+class TelegramDispatcher:
+    """
+    Sends Telegram messages over a pooled HTTP session with a bounded
+    number of requests in flight.
+    """
+
+    def __init__(self, bot_token=None, api_url=None, max_in_flight=None,
+                 per_second=None, chat_interval=None, max_retries=3, timeout=10):
+        self.bot_token = bot_token if bot_token is not None else getattr(settings, 'TELEGRAM_BOT_TOKEN', None)
+        self.api_url = (api_url or getattr(settings, 'TELEGRAM_API_URL', 'https://api.telegram.org')).rstrip('/')
+        self.max_in_flight = max_in_flight or getattr(settings, 'TELEGRAM_MAX_IN_FLIGHT', 20)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.limiter = RateLimiter(
+            per_second if per_second is not None else getattr(settings, 'TELEGRAM_MESSAGES_PER_SECOND', 30),
+            chat_interval if chat_interval is not None else getattr(settings, 'TELEGRAM_CHAT_INTERVAL', 1.0),
+            shared=is_shared_cache(),
+        )
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @instrument('telegram_send')
+    def send(self, chat_id: str, text: str) -> DeliveryResult:
+        """
+        Send one message, retrying on rate limits and transient errors.
+        """
+        chat_id = str(chat_id)
+        if not self.bot_token:
+            logger.warning("TELEGRAM_BOT_TOKEN not configured")
+            return DeliveryResult(chat_id, False, error='bot token not configured')
+
+        url = f"{self.api_url}/bot{self.bot_token}/sendMessage"
+        payload = {
+            'chat_id': chat_id,
+            'text': text,
+            'parse_mode': 'HTML'
+        }
+
+        result = DeliveryResult(chat_id, False)
+        backoff = 1.0
+        while result.attempts <= self.max_retries:
+            self.limiter.acquire(chat_id)
+            result.attempts += 1
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                result.error = str(e)
+                backoff = self._backoff(result, backoff)
+                continue
+
+            result.status_code = response.status_code
+            try:
+                body = response.json()
+            except ValueError:
+                body = {}
+
+            if response.status_code == 200 and body.get('ok', False):
+                result.ok = True
+                result.error = ''
+                result.sent_at = time.time()
+                return result
+
+            result.error = body.get('description', response.reason or '')
+
+            if response.status_code == 429:
+                retry_after = body.get('parameters', {}).get('retry_after') \
+                    or response.headers.get('Retry-After') or backoff
+                self.limiter.pause(float(retry_after))
+                continue
+
+            if response.status_code >= 500:
+                backoff = self._backoff(result, backoff)
+                continue
+
+            # Other client errors (blocked bot, bad chat id) will not succeed on retry
+            break
+
+        logger.warning(
+            "Telegram delivery failed",
+            extra={'chat_id': chat_id, 'status_code': result.status_code, 'attempts': result.attempts, 'error': result.error},
+        )
+        return result
+
+    def _backoff(self, result: DeliveryResult, delay: float) -> float:
+        if result.attempts <= self.max_retries:
+            time.sleep(delay)
+        return delay * 2
+
+    def send_many(self, messages) -> list:
+        """
+        Send (chat_id, text) pairs concurrently.
+        Returns one DeliveryResult per message, in input order.
+        """
+        messages = list(messages)
+        if not messages:
+            return []
+        workers = min(self.max_in_flight, len(messages))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda message: self.send(*message), messages))
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> TelegramDispatcher:
+    """Return the process-wide dispatcher so the HTTP pool is reused"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = TelegramDispatcher()
+        return _dispatcher
+
+
+def set_dispatcher(dispatcher: TelegramDispatcher) -> TelegramDispatcher:
+    """Replace the process-wide dispatcher, e.g. with one pointed at a stub. Returns the previous one."""
+    global _dispatcher
+    with _dispatcher_lock:
+        previous, _dispatcher = _dispatcher, dispatcher
+        return previous
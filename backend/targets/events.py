@@ -0,0 +1,141 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Events a slow subscriber may fall behind by before it is told to resync
+SUBSCRIBER_BACKLOG = 1000
+
+
+class Subscription:
+    """Queue of events for one streaming connection"""
+
+    def __init__(self, broker, maxsize=SUBSCRIBER_BACKLOG):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, event: dict):
+        """Called on the subscriber's event loop"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Drop the backlog; the stream re-sends a full snapshot instead
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'reset', 'data': None})
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Fans target events out to every stream connected to this process.
+    Suitable for a single ASGI process; use a pub/sub backend such as
+    RedisBroker when several processes serve streams or write targets.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    def publish(self, event: dict):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Publishes events to a Redis channel and relays messages from that
+    channel to the local subscribers of every process. Needs the `redis`
+    package and TARGET_EVENTS_REDIS_URL.
+    """
+
+    channel = 'skyguard:targets'
+
+    def __init__(self):
+        super().__init__()
+        import redis
+
+        self._url = getattr(settings, 'TARGET_EVENTS_REDIS_URL', 'redis://localhost:6379/0')
+        self._client = redis.Redis.from_url(self._url)
+        self._listener = None
+
+    def publish(self, event: dict):
+        self._client.publish(self.channel, json.dumps(event))
+
+    def subscribe(self) -> Subscription:
+        if self._listener is None:
+            self._listener = threading.Thread(target=self._listen, daemon=True)
+            self._listener.start()
+        return super().subscribe()
+
+    def _listen(self):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        for message in pubsub.listen():
+            super().publish(json.loads(message['data']))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the broker configured by TARGET_EVENTS_BROKER"""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            path = getattr(settings, 'TARGET_EVENTS_BROKER', 'targets.events.InProcessBroker')
+            _broker = import_string(path)()
+        return _broker
+
+
+def is_on_map(target) -> bool:
+    return target.status in ('confirmed', 'unconfirmed') and target.parent_target_id is None
+
+
+def target_event(target, created=False):
+    """
+    Build the event describing the current state of a target, or None
+    for new reports that are not shown on the map.
+    """
+    from .serializers import TargetSerializer
+
+    if is_on_map(target):
+        return {'type': 'created' if created else 'updated', 'data': TargetSerializer(target).data}
+    if created:
+        return None
+    return {'type': 'resolved', 'data': {'id': target.pk}}
+
+
+def publish_targets(targets, created=False):
+    broker = get_broker()
+    for target in targets:
+        event = target_event(target, created)
+        if event is not None:
+            broker.publish(event)
+
+
+def publish_resolved(target_ids):
+    broker = get_broker()
+    for pk in target_ids:
+        broker.publish({'type': 'resolved', 'data': {'id': pk}})
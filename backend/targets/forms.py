@@ -50,3 +50,11 @@ class TargetAdminForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['map_picker'].widget.attrs['class'] = 'map-picker-field'
+
+
+class ShelterImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV, GeoJSON or NDJSON")
+    format = forms.ChoiceField(
+        choices=[('', 'From file extension'), ('csv', 'CSV'), ('geojson', 'GeoJSON'), ('ndjson', 'NDJSON')],
+        required=False,
+    )
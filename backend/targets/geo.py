@@ -0,0 +1,100 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+# Size of a subscriber grid cell in degrees (~28 km north-south).
+GRID_CELL_DEG = 0.25
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Distance between two points on Earth in kilometers.
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def haversine_many(latitude: float, longitude: float, latitudes, longitudes) -> np.ndarray:
+    """
+    Distances in kilometers from one point to each of N points.
+    latitudes/longitudes may be any sequence or array of equal length.
+    """
+    lat1 = math.radians(latitude)
+    lon1 = math.radians(longitude)
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon2 = np.radians(np.asarray(longitudes, dtype=np.float64))
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_pairwise(latitudes, longitudes) -> np.ndarray:
+    """
+    N x N matrix of distances in kilometers between all given points.
+    Memory grows quadratically, so keep N small (a few thousand at most).
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + \
+        np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_cross(latitudes1, longitudes1, latitudes2, longitudes2) -> np.ndarray:
+    """
+    N x M matrix of distances in kilometers from each of N points to
+    each of M points.
+    """
+    lat1 = np.radians(np.asarray(latitudes1, dtype=np.float64))[:, None]
+    lon1 = np.radians(np.asarray(longitudes1, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(latitudes2, dtype=np.float64))[None, :]
+    lon2 = np.radians(np.asarray(longitudes2, dtype=np.float64))[None, :]
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def grid_cell(latitude: float, longitude: float) -> str:
+    """
+    Return the key of the grid cell containing the given point.
+    Keys look like "201:84" (latitude row : longitude column).
+    """
+    row = math.floor(latitude / GRID_CELL_DEG)
+    col = math.floor(longitude / GRID_CELL_DEG)
+    return f"{row}:{col}"
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float):
+    """
+    Return (min_lat, max_lat, min_lon, max_lon) of a box that fully
+    contains the circle of radius_km around the given point.
+    """
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(min(abs(latitude) + delta_lat, 89.9)))
+    delta_lon = math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat))
+    return (
+        latitude - delta_lat,
+        latitude + delta_lat,
+        longitude - delta_lon,
+        longitude + delta_lon,
+    )
+
+
+def grid_cells_in_radius(latitude: float, longitude: float, radius_km: float) -> list:
+    """
+    Return keys of all grid cells touched by the bounding box of the
+    circle of radius_km around the given point.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+    rows = range(math.floor(min_lat / GRID_CELL_DEG), math.floor(max_lat / GRID_CELL_DEG) + 1)
+    cols = range(math.floor(min_lon / GRID_CELL_DEG), math.floor(max_lon / GRID_CELL_DEG) + 1)
+    return [f"{row}:{col}" for row in rows for col in cols]
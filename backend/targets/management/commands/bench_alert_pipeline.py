@@ -0,0 +1,217 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import Max, Min
+from django.test import override_settings
+from django.test.utils import setup_databases, teardown_databases
+from rest_framework.test import APIClient
+
+from targets.clustering import MIN_CLUSTER_AUTHORS
+from targets.coalescing import has_waiting_alerts
+from targets.dispatch import TelegramDispatcher, set_dispatcher
+from targets.geo import grid_cells_in_radius
+from targets.models import AlertDelivery, NotificationJob, RegionMembership, Target
+from targets.outbox import run_once
+from targets.regions import ALERT_RADIUS_KM, ensure_regions
+from targets.telegram_stub import TelegramStubServer
+from users.models import UserProfile
+
+USERNAME_PREFIX = 'bench-pipeline'
+
+
+def seed_subscribers(rng, centers, count) -> list:
+    """
+    Create count users with a Telegram chat id, located around random
+    centers, and their region memberships. Returns the users.
+    """
+    users = User.objects.bulk_create([User(username=f"{USERNAME_PREFIX}-{i}") for i in range(count)])
+    profiles = []
+    for i, user in enumerate(users):
+        latitude, longitude = rng.choice(centers)
+        profiles.append(UserProfile(
+            user=user,
+            last_latitude=latitude + rng.gauss(0, 0.15),
+            last_longitude=longitude + rng.gauss(0, 0.2),
+            telegram_chat_id=str(10 ** 9 + i),
+        ))
+    profiles = UserProfile.objects.bulk_create(profiles)
+
+    cells = {
+        profile.pk: grid_cells_in_radius(profile.last_latitude, profile.last_longitude, ALERT_RADIUS_KM)
+        for profile in profiles
+    }
+    regions = ensure_regions(code for codes in cells.values() for code in codes)
+    RegionMembership.objects.bulk_create([
+        RegionMembership(region=regions[code], profile_id=profile_id)
+        for profile_id, codes in cells.items() for code in codes
+    ], batch_size=5000)
+    return users
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a report storm through the whole alerting pipeline against a local "
+        "Telegram stub and print p50/p99 latencies for ingestion, aggregation, "
+        "confirmation and fan-out. Runs in a throwaway test database (the database "
+        "user needs CREATE DATABASE), so no real jobs, alerts or subscribers are touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=2000)
+        parser.add_argument('--clusters', type=int, default=20, help="Threats in the storm")
+        parser.add_argument('--reports', type=int, default=MIN_CLUSTER_AUTHORS, help="Reports per threat")
+        parser.add_argument('--latency', type=float, default=0.02, help="Stub reply latency in seconds")
+        parser.add_argument('--messages-per-second', type=float, default=1000)
+        parser.add_argument('--coalesce-seconds', type=float, default=None, help="Override ALERT_COALESCE_SECONDS")
+        parser.add_argument('--workers', type=int, default=1, help="Notification worker threads")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.stdout.write("Creating a test database...")
+        databases = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            self.run_benchmark(options)
+        finally:
+            teardown_databases(databases, verbosity=0)
+
+    def run_benchmark(self, options):
+        rng = random.Random(options['seed'])
+        # Keep cache entries and target events away from the live ones
+        overrides = {
+            'CACHES': {'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'bench-alert-pipeline',
+            }},
+            'TARGET_EVENTS_BROKER': 'targets.events.InProcessBroker',
+        }
+        if options['coalesce_seconds'] is not None:
+            overrides['ALERT_COALESCE_SECONDS'] = options['coalesce_seconds']
+
+        with TelegramStubServer(latency=options['latency']) as stub, override_settings(**overrides):
+            previous = set_dispatcher(TelegramDispatcher(
+                bot_token='bench',
+                api_url=stub.url,
+                per_second=options['messages_per_second'],
+                chat_interval=0,
+            ))
+            try:
+                centers = [(rng.uniform(49.5, 54.3), rng.uniform(14.6, 23.6)) for _ in range(options['clusters'])]
+                self.stdout.write(f"Seeding {options['subscribers']} subscribers...")
+                subscribers = seed_subscribers(rng, centers, options['subscribers'])
+                admin = User.objects.create_user(f"{USERNAME_PREFIX}-admin", is_staff=True)
+                self.run_storm(rng, centers, subscribers, admin, options, stub)
+            finally:
+                set_dispatcher(previous)
+
+    def run_storm(self, rng, centers, subscribers, admin, options, stub):
+        samples = defaultdict(list)
+        raised_at = {}
+
+        # Every report goes through try_aggregate(), time it on its own
+        original_try_aggregate = Target.try_aggregate
+
+        def timed_try_aggregate(target):
+            start = time.perf_counter()
+            try:
+                return original_try_aggregate(target)
+            finally:
+                samples['aggregation'].append(time.perf_counter() - start)
+
+        stop = threading.Event()
+        workers = [
+            threading.Thread(target=self.worker, args=(stop,), daemon=True)
+            for _ in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        reports = [
+            (cluster, author)
+            for cluster, _ in enumerate(centers)
+            for author in rng.sample(subscribers, options['reports'])
+        ]
+        rng.shuffle(reports)
+
+        client = APIClient()
+        Target.try_aggregate = timed_try_aggregate
+        storm_start = time.perf_counter()
+        try:
+            for cluster, author in reports:
+                latitude, longitude = centers[cluster]
+                client.force_authenticate(author)
+                start = time.time()
+                response = client.post('/api/targets/', {
+                    'title': 'DRONE',
+                    'latitude': latitude + rng.uniform(-0.005, 0.005),
+                    'longitude': longitude + rng.uniform(-0.005, 0.005),
+                    'target_type': 'drone',
+                }, format='json')
+                samples['ingestion'].append(time.time() - start)
+                if response.data.get('status') == 'unconfirmed':
+                    raised_at[response.data['id']] = start
+        finally:
+            Target.try_aggregate = original_try_aggregate
+        storm_seconds = time.perf_counter() - storm_start
+
+        client.force_authenticate(admin)
+        for target_id in raised_at:
+            start = time.perf_counter()
+            client.post(f'/api/targets/{target_id}/confirm/')
+            samples['confirmation'].append(time.perf_counter() - start)
+
+        self.stdout.write(f"Storm of {len(reports)} reports took {storm_seconds:.2f} s, waiting for delivery...")
+        deadline = time.monotonic() + 600
+        while time.monotonic() < deadline:
+            if not NotificationJob.objects.filter(status__in=['pending', 'processing']).exists() \
+                    and not has_waiting_alerts():
+                break
+            time.sleep(0.2)
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+        deliveries = AlertDelivery.objects.filter(target_id__in=raised_at).values('target_id').annotate(
+            first=Min('sent_at'), last=Max('sent_at')
+        )
+        for row in deliveries:
+            start = datetime.fromtimestamp(raised_at[row['target_id']], dt_timezone.utc)
+            if row['first']:
+                samples['first alert'].append((row['first'] - start).total_seconds())
+                samples['full fan-out'].append((row['last'] - start).total_seconds())
+
+        self.report(samples)
+        self.stdout.write(
+            f"\n{len(raised_at)}/{len(centers)} threats raised, "
+            f"{AlertDelivery.objects.filter(target_id__in=raised_at, status='sent').count()} alerts "
+            f"in {len(stub.messages)} Telegram messages"
+        )
+
+    def worker(self, stop):
+        try:
+            while not stop.is_set():
+                try:
+                    handled = run_once(50)
+                except Exception as e:
+                    self.stderr.write(f"Worker error: {e}")
+                    handled = 0
+                if not handled:
+                    time.sleep(0.05)
+        finally:
+            close_old_connections()
+
+    def report(self, samples):
+        self.stdout.write(f"\n{'stage':<14} {'n':>6} {'p50 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+        for stage in ('ingestion', 'aggregation', 'confirmation', 'first alert', 'full fan-out'):
+            values = np.asarray(samples[stage]) * 1000
+            if not len(values):
+                self.stdout.write(f"{stage:<14} {0:>6}")
+                continue
+            p50, p99 = np.percentile(values, [50, 99])
+            self.stdout.write(f"{stage:<14} {len(values):>6} {p50:>10.1f} {p99:>10.1f} {values.max():>10.1f}")
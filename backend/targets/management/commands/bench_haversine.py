@@ -0,0 +1,48 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from targets.geo import haversine, haversine_many, haversine_pairwise
+
+
+class Command(BaseCommand):
+    help = "Compare the scalar haversine loop with the vectorized kernel"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+        parser.add_argument('--pairwise-size', type=int, default=1_000)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(42)
+        origin_lat, origin_lon = 52.23, 21.01
+
+        self.stdout.write(f"{'points':>10} {'scalar ms':>12} {'vector ms':>12} {'speedup':>9}")
+        for size in options['sizes']:
+            lats = rng.uniform(49.0, 54.8, size)
+            lons = rng.uniform(14.1, 24.1, size)
+            lat_list = lats.tolist()
+            lon_list = lons.tolist()
+
+            start = time.perf_counter()
+            scalar = [haversine(origin_lat, origin_lon, lat, lon) for lat, lon in zip(lat_list, lon_list)]
+            scalar_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            vector = haversine_many(origin_lat, origin_lon, lats, lons)
+            vector_time = time.perf_counter() - start
+
+            if not np.allclose(scalar, vector):
+                self.stderr.write(f"Results differ for {size} points")
+
+            self.stdout.write(
+                f"{size:>10} {scalar_time * 1000:>12.1f} {vector_time * 1000:>12.1f} "
+                f"{scalar_time / vector_time:>8.1f}x"
+            )
+
+        size = options['pairwise_size']
+        lats = rng.uniform(49.0, 54.8, size)
+        lons = rng.uniform(14.1, 24.1, size)
+        start = time.perf_counter()
+        haversine_pairwise(lats, lons)
+        self.stdout.write(f"pairwise {size}x{size}: {(time.perf_counter() - start) * 1000:.1f} ms")
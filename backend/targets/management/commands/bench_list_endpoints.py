@@ -0,0 +1,71 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+
+from targets.caching import bump_version
+from targets.models import Target, Shelter
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure requests per second of the public list endpoints without cache, "
+        "with the versioned cache and with conditional (If-None-Match) polls. "
+        "Seeded rows are rolled back and responses are cached in a private cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--targets', type=int, default=500)
+        parser.add_argument('--shelters', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        client = Client()
+
+        # Bodies of the rolled back rows must never reach the shared cache
+        private_cache = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'bench-list-endpoints',
+        }})
+        with private_cache, transaction.atomic():
+            author = User.objects.create(username='bench-list-endpoints')
+            Target.objects.bulk_create([
+                Target(
+                    title='DRONE',
+                    latitude=rng.uniform(49.0, 54.8),
+                    longitude=rng.uniform(14.1, 24.1),
+                    status=rng.choice(['confirmed', 'unconfirmed']),
+                    author=author,
+                )
+                for _ in range(options['targets'])
+            ])
+            Shelter.objects.bulk_create([
+                Shelter(
+                    title=f"Shelter {i}",
+                    capacity=rng.randint(20, 500),
+                    latitude=rng.uniform(49.0, 54.8),
+                    longitude=rng.uniform(14.1, 24.1),
+                )
+                for i in range(options['shelters'])
+            ])
+
+            self.stdout.write(f"{'endpoint':<12} {'uncached':>12} {'cached':>12} {'304':>12}  (req/s)")
+            for name, url, scope in [('targets', '/api/targets/', 'targets'), ('shelters', '/api/shelters/', 'shelters')]:
+                uncached = self.measure(options['requests'], lambda: (bump_version(scope), client.get(url)))
+                cached = self.measure(options['requests'], lambda: client.get(url))
+                etag = client.get(url)['ETag']
+                conditional = self.measure(options['requests'], lambda: client.get(url, HTTP_IF_NONE_MATCH=etag))
+                self.stdout.write(f"{name:<12} {uncached:>12.0f} {cached:>12.0f} {conditional:>12.0f}")
+
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def measure(count, request):
+        start = time.perf_counter()
+        for _ in range(count):
+            request()
+        return count / (time.perf_counter() - start)
@@ -0,0 +1,83 @@
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from targets.clustering import ClusterIndex
+from targets.models import Target
+
+
+def _decision(result):
+    main_target, cluster = result
+    if main_target is not None:
+        return ('join', main_target.pk)
+    if cluster is not None:
+        return ('cluster', sorted(t.pk for t in cluster))
+    return ('none',)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a synthetic report storm and check that the indexed clustering "
+        "makes the same decisions as a full scan. All writes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reports', type=int, default=2000)
+        parser.add_argument('--authors', type=int, default=200)
+        parser.add_argument('--hotspots', type=int, default=40)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        index = ClusterIndex()
+        mismatches = 0
+        joined = clustered = 0
+
+        with transaction.atomic():
+            authors = User.objects.bulk_create([
+                User(username=f"check-clustering-{options['seed']}-{i}")
+                for i in range(options['authors'])
+            ])
+            hotspots = [
+                (rng.uniform(49.0, 54.8), rng.uniform(14.1, 24.1))
+                for _ in range(options['hotspots'])
+            ]
+            types = [choice for choice, _ in Target.TYPE_CHOICES]
+
+            for i in range(options['reports']):
+                lat, lon = rng.choice(hotspots)
+                report = Target(
+                    title='CHECK',
+                    latitude=lat + rng.gauss(0, 0.01),
+                    longitude=lon + rng.gauss(0, 0.015),
+                    target_type=rng.choice(types[:2]),
+                    author=rng.choice(authors),
+                )
+                # bulk_create skips save(), so neither engine runs yet
+                Target.objects.bulk_create([report])
+                report.refresh_from_db(fields=['created_at'])
+                index.observe(report)
+
+                expected = _decision(report.find_aggregation())
+                actual = _decision(report.find_aggregation(index.candidates(report)))
+                if expected != actual:
+                    mismatches += 1
+                    self.stderr.write(f"Report {i}: scan={expected} index={actual}")
+
+                # Apply the decision so later reports see an evolving state
+                report.try_aggregate()
+                report.refresh_from_db()
+                index.observe(report)
+                joined += expected[0] == 'join'
+                clustered += expected[0] == 'cluster'
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{options['reports']} reports replayed: {joined} joined, "
+            f"{clustered} new clusters, {mismatches} mismatches"
+        )
+        if mismatches:
+            raise CommandError("Indexed clustering diverged from the full scan")
@@ -0,0 +1,138 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from targets.clustering import AGGREGATION_WINDOW
+from targets.models import Target
+
+SEED_TITLE = 'EXPLAIN-SEED'
+SEED_USERNAME = 'explain-seed'
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic targets into a throwaway test database (Postgres or SQLite) "
+        "and print EXPLAIN plans and latencies of the hot Target queries. The "
+        "database user needs CREATE DATABASE; live targets are never touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help="Number of targets to add before measuring")
+        parser.add_argument('--keepdb', action='store_true', help="Keep the test database and its seeded targets for the next run")
+        parser.add_argument('--runs', type=int, default=20, help="Timed runs per query")
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        self.stdout.write("Creating a test database...")
+        databases = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'], aliases={'default'})
+        try:
+            self.measure(options)
+        finally:
+            teardown_databases(databases, verbosity=0, keepdb=options['keepdb'])
+
+    def measure(self, options):
+        if options['seed']:
+            self.seed(options['seed'], options['batch_size'])
+
+        for name, queryset in self.hot_queries():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {name}"))
+            self.stdout.write(self.explain(queryset))
+            timings = []
+            for _ in range(options['runs']):
+                start = time.perf_counter()
+                list(queryset[:500])
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f"p50 {statistics.median(timings):.2f} ms, "
+                f"max {max(timings):.2f} ms over {options['runs']} runs"
+            )
+
+    def seed(self, count, batch_size):
+        """
+        Mimic production: most rows are old resolved reports and cluster
+        members, a small share falls inside the aggregation window.
+        """
+        rng = random.Random(0)
+        now = timezone.now()
+        authors = list(User.objects.filter(username__startswith=SEED_USERNAME))
+        if not authors:
+            authors = User.objects.bulk_create([
+                User(username=f"{SEED_USERNAME}-{i}") for i in range(1000)
+            ])
+        roots = list(Target.objects.filter(title=SEED_TITLE, parent_target__isnull=True).values_list('pk', flat=True)[:1000])
+        types = [value for value, _ in Target.TYPE_CHOICES]
+
+        created = 0
+        while created < count:
+            batch = []
+            for _ in range(min(batch_size, count - created)):
+                recent = rng.random() < 0.02
+                age = timedelta(seconds=rng.uniform(0, 7200)) if recent else timedelta(days=rng.uniform(0.1, 365))
+                parent = rng.choice(roots) if roots and rng.random() < 0.6 else None
+                if recent:
+                    state = rng.choice(['pending', 'pending', 'unconfirmed', 'confirmed'])
+                else:
+                    state = rng.choice(['pending', 'confirmed', 'rejected', 'rejected'])
+                batch.append(Target(
+                    title=SEED_TITLE,
+                    latitude=rng.uniform(49.0, 54.8),
+                    longitude=rng.uniform(14.1, 24.1),
+                    status=state,
+                    target_type=rng.choice(types),
+                    author=rng.choice(authors),
+                    parent_target_id=parent,
+                ))
+                batch[-1]._seed_created_at = now - age
+
+            with transaction.atomic():
+                Target.objects.bulk_create(batch)
+                # auto_now_add ignores explicit values, so spread the ages afterwards
+                self.backdate(batch)
+            if not roots:
+                roots = [t.pk for t in batch if t.parent_target_id is None][:1000]
+            created += len(batch)
+            self.stdout.write(f"Seeded {created}/{count}")
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {Target._meta.db_table}")
+
+    def backdate(self, batch):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {Target._meta.db_table} SET created_at = %s, updated_at = %s WHERE id = %s",
+                [(t._seed_created_at, t._seed_created_at, t.pk) for t in batch],
+            )
+
+    def hot_queries(self):
+        now = timezone.now()
+        recent = now - AGGREGATION_WINDOW
+        sample = Target.objects.filter(parent_target__isnull=False).values_list('parent_target_id', 'author_id').first() or (0, 0)
+        parent_id, author_id = sample
+
+        roots = Target.objects.filter(target_type='drone', created_at__gte=recent, parent_target__isnull=True)
+        return [
+            ("aggregation: main targets in window", roots.filter(status__in=['unconfirmed', 'confirmed'])),
+            ("aggregation: pending reports in window", roots.filter(status='pending')),
+            ("aggregation: duplicate author in cluster", Target.objects.filter(parent_target_id=parent_id, author_id=author_id)),
+            ("aggregation: cluster totals", Target.objects.filter(Q(parent_target_id=parent_id) | Q(pk=parent_id))),
+            ("cluster index sync", Target.objects.filter(created_at__gte=now - timedelta(seconds=30))),
+            ("map list", Target.objects.filter(status__in=['confirmed', 'unconfirmed'], parent_target__isnull=True)),
+            ("map delta (?since=)", Target.objects.filter(updated_at__gt=now - timedelta(seconds=5), parent_target__isnull=True)),
+            ("all-clear: confirmed threats", Target.objects.filter(status='confirmed')),
+            ("pending list", Target.objects.filter(status='pending')),
+        ]
+
+    @staticmethod
+    def explain(queryset):
+        if connection.vendor == 'postgresql':
+            return queryset.explain(analyze=True, buffers=True)
+        return queryset.explain()
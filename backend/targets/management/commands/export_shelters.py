@@ -0,0 +1,23 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from targets.datasets import EXPORT_BATCH_SIZE, FORMATS, export_shelters
+
+
+class Command(BaseCommand):
+    help = "Stream all shelters as CSV, GeoJSON or NDJSON to a file or stdout."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='geojson')
+        parser.add_argument('-o', '--output', help="Default: stdout")
+        parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in export_shelters(options['format'], batch_size=options['batch_size']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from targets.datasets import FORMATS, IMPORT_BATCH_SIZE, InvalidRecord, detect_format, import_batches, text_stream
+
+
+class Command(BaseCommand):
+    help = (
+        "Upsert shelters from a CSV, GeoJSON or NDJSON file ('-' for stdin), "
+        "matching existing ones by external_id. The file is streamed in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help="Default: from the file extension")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            fmt = options['format'] or detect_format(path)
+        except ValueError as e:
+            raise CommandError(f"{e}; pass --format")
+
+        binary = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        result = None
+        try:
+            for result in import_batches(text_stream(binary), fmt, options['batch_size']):
+                self.stdout.write(f"{result}")
+        except (InvalidRecord, UnicodeDecodeError) as e:
+            raise CommandError(f"Stopped after {result or 'no records'}: {e}")
+        finally:
+            if binary is not sys.stdin.buffer:
+                binary.close()
+
+        for error in result.errors:
+            self.stderr.write(error)
+        if result.skipped > len(result.errors):
+            self.stderr.write(f"... and {result.skipped - len(result.errors)} more invalid record(s)")
+        self.stdout.write(self.style.SUCCESS(f"Done: {result}"))
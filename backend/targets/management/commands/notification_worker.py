@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from targets.coalescing import has_waiting_alerts
+from targets.outbox import run_once
+
+
+class Command(BaseCommand):
+    help = "Deliver queued threat and all-clear notifications. Several workers may run in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--poll-interval', type=float, default=0.5, help="Seconds to sleep when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Notification worker started")
+        try:
+            while True:
+                handled = run_once(options['batch_size'])
+                if handled:
+                    self.stdout.write(f"Processed {handled} job(s) and message(s)")
+                    continue
+                # Buffered alerts become due within the coalescing window
+                if options['once'] and not has_waiting_alerts():
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Notification worker stopped")
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from targets.telegram_stub import TelegramStubServer
+
+
+class Command(BaseCommand):
+    help = "Run a local Telegram Bot API stub for testing notification delivery"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8081)
+        parser.add_argument('--latency', type=float, default=0.0, help="Seconds to wait before each reply")
+        parser.add_argument('--rate-limit-every', type=int, default=0, help="Answer every N-th request with 429")
+        parser.add_argument('--retry-after', type=int, default=1)
+
+    def handle(self, *args, **options):
+        stub = TelegramStubServer(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency'],
+            rate_limit_every=options['rate_limit_every'],
+            retry_after=options['retry_after'],
+        )
+        self.stdout.write(f"Telegram stub listening on {stub.url} (set TELEGRAM_API_URL to use it)")
+        try:
+            stub.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.server.server_close()
+            self.stdout.write(f"Received {len(stub.messages)} message(s)")
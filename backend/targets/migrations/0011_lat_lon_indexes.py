@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('targets', '0010_target_updated_at_targettombstone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shelter',
+            index=models.Index(fields=['latitude', 'longitude'], name='shelter_lat_lon_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='target',
+            index=models.Index(fields=['latitude', 'longitude'], name='target_lat_lon_idx'),
+        ),
+    ]
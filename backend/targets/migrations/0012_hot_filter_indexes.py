@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('targets', '0011_lat_lon_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='target',
+            index=models.Index(condition=models.Q(('parent_target__isnull', True), ('status__in', ['pending', 'unconfirmed', 'confirmed'])), fields=['target_type', 'created_at'], name='target_recent_root_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='target',
+            index=models.Index(condition=models.Q(('parent_target__isnull', True), ('status__in', ['unconfirmed', 'confirmed'])), fields=['-created_at'], name='target_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='target',
+            index=models.Index(fields=['parent_target', 'author'], name='target_parent_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='target',
+            index=models.Index(fields=['status'], name='target_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='target',
+            index=models.Index(fields=['created_at'], name='target_created_idx'),
+        ),
+    ]
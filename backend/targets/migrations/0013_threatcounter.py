@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:59
+
+from django.db import migrations, models
+
+
+def count_active_threats(apps, schema_editor):
+    Target = apps.get_model('targets', 'Target')
+    ThreatCounter = apps.get_model('targets', 'ThreatCounter')
+    ThreatCounter.objects.create(
+        scope='global',
+        active=Target.objects.filter(
+            parent_target__isnull=True,
+            status__in=['unconfirmed', 'confirmed'],
+        ).count(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('targets', '0012_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThreatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=64, unique=True)),
+                ('active', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(count_active_threats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def assign_regions(apps, schema_editor):
+    from targets.geo import grid_cell, grid_cells_in_radius
+    from targets.regions import ALERT_RADIUS_KM
+
+    Region = apps.get_model('targets', 'Region')
+    RegionMembership = apps.get_model('targets', 'RegionMembership')
+    Target = apps.get_model('targets', 'Target')
+    ThreatCounter = apps.get_model('targets', 'ThreatCounter')
+    UserProfile = apps.get_model('users', 'UserProfile')
+
+    regions = {}
+
+    def region(code):
+        if code not in regions:
+            regions[code], _ = Region.objects.get_or_create(code=code)
+        return regions[code]
+
+    profiles = UserProfile.objects.filter(last_latitude__isnull=False, last_longitude__isnull=False)
+    for profile in profiles.iterator():
+        RegionMembership.objects.bulk_create([
+            RegionMembership(region=region(code), profile=profile)
+            for code in grid_cells_in_radius(profile.last_latitude, profile.last_longitude, ALERT_RADIUS_KM)
+        ])
+
+    active = {}
+    threats = Target.objects.filter(parent_target__isnull=True, status__in=['unconfirmed', 'confirmed'])
+    for latitude, longitude in threats.values_list('latitude', 'longitude'):
+        code = grid_cell(latitude, longitude)
+        active[code] = active.get(code, 0) + 1
+    ThreatCounter.objects.bulk_create([
+        ThreatCounter(scope=code, active=count) for code, count in active.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('targets', '0013_threatcounter'),
+        ('users', '0006_userprofile_geo_cell'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Region',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=32, unique=True)),
+                ('name', models.CharField(blank=True, max_length=200)),
+            ],
+            options={
+                'ordering': ['code'],
+            },
+        ),
+        migrations.AddField(
+            model_name='notificationjob',
+            name='scope',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='RegionMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='region_memberships', to='users.userprofile')),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='targets.region')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('region', 'profile'), name='unique_region_membership')],
+            },
+        ),
+        migrations.RunPython(assign_regions, migrations.RunPython.noop),
+    ]
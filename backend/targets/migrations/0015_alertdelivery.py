@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('targets', '0014_regions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.CharField(max_length=100)),
+                ('distance', models.FloatField(help_text='Distance in km')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('due_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_deliveries', to='targets.target')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'due_at'], name='targets_ale_status_7ca2a9_idx'), models.Index(fields=['chat_id', 'status'], name='targets_ale_chat_id_57b9fc_idx')],
+                'constraints': [models.UniqueConstraint(fields=('chat_id', 'target'), name='unique_alert_delivery')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('targets', '0015_alertdelivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alertdelivery',
+            name='priority',
+            field=models.FloatField(default=0, help_text='Higher is sent sooner (see coalescing.alert_priority)'),
+        ),
+    ]
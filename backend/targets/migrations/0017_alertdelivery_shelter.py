@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('targets', '0016_alertdelivery_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alertdelivery',
+            name='shelter',
+            field=models.ForeignKey(blank=True, help_text='Shelter suggested in the alert', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='alert_deliveries', to='targets.shelter'),
+        ),
+        migrations.AddField(
+            model_name='alertdelivery',
+            name='shelter_distance',
+            field=models.FloatField(blank=True, help_text='Distance to the shelter in km', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('targets', '0017_alertdelivery_shelter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shelter',
+            name='external_id',
+            field=models.CharField(blank=True, help_text='Identifier in the imported dataset (see datasets.import_shelters)', max_length=100, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:40
+
+import uuid
+
+from django.db import migrations, models
+
+
+def generate_external_ids(apps, schema_editor):
+    Shelter = apps.get_model('targets', 'Shelter')
+    shelters = list(Shelter.objects.filter(models.Q(external_id__isnull=True) | models.Q(external_id='')))
+    for shelter in shelters:
+        shelter.external_id = f"local:{uuid.uuid4().hex}"
+    Shelter.objects.bulk_update(shelters, ['external_id'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('targets', '0018_shelter_external_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shelter',
+            name='external_id',
+            field=models.CharField(blank=True, help_text='Identifier in the imported dataset (see datasets.import_shelters), generated when empty', max_length=100, null=True, unique=True),
+        ),
+        migrations.RunPython(generate_external_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('targets', '0019_shelter_external_id_backfill'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alertdelivery',
+            index=models.Index(fields=['created_at'], name='targets_ale_created_1e75e1_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:10
+
+from django.db import migrations
+
+
+def delete_global_counter(apps, schema_editor):
+    ThreatCounter = apps.get_model('targets', 'ThreatCounter')
+    ThreatCounter.objects.filter(scope='global').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('targets', '0020_alertdelivery_created_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_global_counter, migrations.RunPython.noop),
+    ]
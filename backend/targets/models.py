@@ -1,18 +1,16 @@
-from django.db import models
+import uuid
+from collections import Counter, defaultdict
+from datetime import timedelta
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django_admin_geomap import GeoItem
-from math import radians, cos, sin, asin, sqrt
 from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-
-
-def haversine(lon1, lat1, lon2, lat2):
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    return c * 6371
+from backend.metrics import instrument
+from .geo import haversine_many
 
 
 class Target(models.Model, GeoItem):
@@ -37,6 +35,13 @@ class Target(models.Model, GeoItem):
         ('high', 'High'),
     )
 
+    # Trust rating change for every author of a confirmed (+) or rejected (-) report
+    RATING_STEP = 0.25
+
+    # Main targets in these states are active threats (see ThreatCounter)
+    ACTIVE_STATUSES = ('unconfirmed', 'confirmed')
+    THREAT_FIELDS = {'status', 'parent_target', 'latitude', 'longitude'}
+
     RADIUS_CHOICES = (
         (1, '1 km'),
         (2, '2 km'),
@@ -54,6 +59,7 @@ class Target(models.Model, GeoItem):
     danger_radius = models.IntegerField(choices=RADIUS_CHOICES, default=2, help_text="Danger radius in km")
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     notifications_sent = models.BooleanField(default=False)
     
     probability = models.CharField(max_length=20, choices=PROBABILITY_CHOICES, default='low', blank=True)
@@ -64,6 +70,26 @@ class Target(models.Model, GeoItem):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='target_lat_lon_idx'),
+            # Aggregation window lookups (find_aggregation)
+            models.Index(
+                fields=['target_type', 'created_at'],
+                name='target_recent_root_idx',
+                condition=Q(parent_target__isnull=True, status__in=['pending', 'unconfirmed', 'confirmed']),
+            ),
+            # Public map list, newest first
+            models.Index(
+                fields=['-created_at'],
+                name='target_active_idx',
+                condition=Q(parent_target__isnull=True, status__in=['unconfirmed', 'confirmed']),
+            ),
+            # Duplicate-author check when joining a cluster
+            models.Index(fields=['parent_target', 'author'], name='target_parent_author_idx'),
+            models.Index(fields=['status'], name='target_status_idx'),
+            # ClusterIndex sync
+            models.Index(fields=['created_at'], name='target_created_idx'),
+        ]
 
     @property
     def geomap_longitude(self):
@@ -76,53 +102,93 @@ class Target(models.Model, GeoItem):
     def __str__(self):
         return f"{self.title} ({self.get_status_display()})"
 
+    @property
+    def is_active_threat(self) -> bool:
+        return self.parent_target_id is None and self.status in self.ACTIVE_STATUSES
+
+    def threat_scopes(self) -> set:
+        """ThreatCounter scopes this target counts towards"""
+        if not self.is_active_threat:
+            return set()
+        return ThreatCounter.scopes_for(self.latitude, self.longitude)
+
+    def _stored_threat_scopes(self, update_fields) -> set:
+        """
+        Scopes the stored row counts towards, read under a row lock so
+        concurrent saves of the same target count its transition once.
+        """
+        if update_fields is not None and not self.THREAT_FIELDS & set(update_fields):
+            return self.threat_scopes()
+        stored = Target.objects.select_for_update().filter(pk=self.pk).values_list(
+            'status', 'parent_target_id', 'latitude', 'longitude'
+        ).first()
+        if stored is None:
+            return set()
+        status, parent_id, latitude, longitude = stored
+        if parent_id is not None or status not in self.ACTIVE_STATUSES:
+            return set()
+        return ThreatCounter.scopes_for(latitude, longitude)
+
+    # The status and parent the row had when loaded or last saved, so
+    # receivers can tell a pending report from a listed target that just
+    # became pending or joined a cluster. None when unknown.
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_stored_state()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None or {'status', 'parent_target', 'parent_target_id'} & set(fields):
+            self._remember_stored_state()
+
+    def _remember_stored_state(self):
+        if {'status', 'parent_target_id'} & self.get_deferred_fields():
+            self._stored_state = None
+        else:
+            self._stored_state = (self.status, self.parent_target_id)
+
+    @property
+    def was_on_map(self) -> bool:
+        """Whether the stored row was shown on the map; True when unknown"""
+        state = getattr(self, '_stored_state', None)
+        if state is None:
+            return True
+        status, parent_id = state
+        return status in self.ACTIVE_STATUSES and parent_id is None
+
     def save(self, *args, **kwargs):
         is_new = self.pk is None
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'updated_at' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'updated_at']
+        # Notification jobs are enqueued by post_save receivers and must
+        # commit together with the status change that caused them
+        with transaction.atomic():
+            before = set() if is_new else self._stored_threat_scopes(update_fields)
+            super().save(*args, **kwargs)
+            self._remember_stored_state()
+            after = self.threat_scopes()
+            if before != after:
+                changes = {scope: -1 for scope in before - after}
+                changes.update({scope: 1 for scope in after - before})
+                ThreatCounter.adjust_many(changes)
         if is_new and self.status == 'pending' and not self.parent_target:
             self.try_aggregate()
 
+    @instrument('try_aggregate')
     def try_aggregate(self):
-        from django.utils import timezone
-        from datetime import timedelta
+        from .clustering import cluster_index
 
-        recent_time = timezone.now() - timedelta(hours=2)
-        aggregation_radius = 2
-        
-        main_targets = Target.objects.filter(
-            target_type=self.target_type,
-            created_at__gte=recent_time,
-            status__in=['unconfirmed', 'confirmed'],
-            parent_target__isnull=True
-        ).exclude(pk=self.pk)
+        main_target, cluster = self.find_aggregation(cluster_index.candidates(self))
 
-        for target in main_targets:
-            distance = haversine(self.longitude, self.latitude, target.longitude, target.latitude)
-            if distance <= aggregation_radius:
-                if not Target.objects.filter(parent_target=target, author=self.author).exists() and target.author_id != self.author_id:
-                    self.parent_target = target
-                    self.save(update_fields=['parent_target'])
-                    target.update_aggregation()
-                return
+        if main_target is not None:
+            self.parent_target = main_target
+            self.save(update_fields=['parent_target'])
+            main_target.update_aggregation()
 
-        pending_targets = Target.objects.filter(
-            target_type=self.target_type,
-            status='pending',
-            parent_target__isnull=True,
-            created_at__gte=recent_time
-        ).exclude(pk=self.pk)
-
-        cluster = [self]
-        unique_authors = {self.author_id}
-
-        for target in pending_targets:
-            distance = haversine(self.longitude, self.latitude, target.longitude, target.latitude)
-            if distance <= aggregation_radius:
-                if target.author_id not in unique_authors:
-                    cluster.append(target)
-                    unique_authors.add(target.author_id)
-
-        if len(cluster) >= 5:
+        elif cluster is not None:
             avg_lat = sum(t.latitude for t in cluster) / len(cluster)
             avg_lon = sum(t.longitude for t in cluster) / len(cluster)
             
@@ -135,22 +201,81 @@ class Target(models.Model, GeoItem):
             self.title = f"{self.get_target_type_display().upper()}"
             self.save(update_fields=['latitude', 'longitude', 'status', 'danger_radius', 'title'])
 
-            for target in cluster:
-                if target.pk != self.pk:
-                    target.parent_target = self
-                    target.save(update_fields=['parent_target'])
+            Target.objects.filter(
+                pk__in=[t.pk for t in cluster if t.pk != self.pk]
+            ).update(parent_target=self, updated_at=timezone.now())
 
             self.update_aggregation()
 
-    def update_aggregation(self):
-        children = Target.objects.filter(parent_target=self)
-        self.report_count = children.count() + 1
+    def find_aggregation(self, candidate_ids=None):
+        """
+        Decide how this report aggregates with recent reports.
+        Returns (main_target, None) when it joins an existing main target,
+        (None, cluster) when it forms a new cluster with pending reports,
+        and (None, None) otherwise.
 
-        total_weight = self._get_author_weight()
-        for child in children:
-            total_weight += child._get_author_weight()
+        candidate_ids restricts the search to those pks (see
+        clustering.ClusterIndex); None scans every recent target.
+        """
+        from .clustering import AGGREGATION_RADIUS_KM, AGGREGATION_WINDOW, MIN_CLUSTER_AUTHORS
 
-        self.weighted_score = total_weight
+        recent_time = timezone.now() - AGGREGATION_WINDOW
+        recent_targets = Target.objects.filter(
+            target_type=self.target_type,
+            created_at__gte=recent_time,
+            parent_target__isnull=True
+        ).exclude(pk=self.pk)
+        if candidate_ids is not None:
+            recent_targets = recent_targets.filter(pk__in=candidate_ids)
+
+        main_targets = list(recent_targets.filter(status__in=['unconfirmed', 'confirmed']))
+        distances = haversine_many(
+            self.latitude, self.longitude,
+            [t.latitude for t in main_targets],
+            [t.longitude for t in main_targets],
+        )
+
+        for target, distance in zip(main_targets, distances):
+            if distance <= AGGREGATION_RADIUS_KM:
+                if not Target.objects.filter(parent_target=target, author=self.author).exists() and target.author_id != self.author_id:
+                    return target, None
+                return None, None
+
+        pending_targets = list(recent_targets.filter(status='pending'))
+        distances = haversine_many(
+            self.latitude, self.longitude,
+            [t.latitude for t in pending_targets],
+            [t.longitude for t in pending_targets],
+        )
+
+        cluster = [self]
+        unique_authors = {self.author_id}
+
+        for target, distance in zip(pending_targets, distances):
+            if distance <= AGGREGATION_RADIUS_KM:
+                if target.author_id not in unique_authors:
+                    cluster.append(target)
+                    unique_authors.add(target.author_id)
+
+        if len(cluster) >= MIN_CLUSTER_AUTHORS:
+            return None, cluster
+        return None, None
+
+    @instrument('update_aggregation')
+    def update_aggregation(self):
+        # Count the cluster and sum its author weights (1 + trust_rating / 10,
+        # or 1 for authors without a profile) in a single query
+        totals = Target.objects.filter(
+            Q(parent_target=self) | Q(pk=self.pk)
+        ).aggregate(
+            report_count=Count('pk'),
+            weighted_score=Sum(
+                Value(1.0) + Coalesce('author__profile__trust_rating', Value(0.0)) / Value(10.0),
+                output_field=models.FloatField(),
+            ),
+        )
+        self.report_count = totals['report_count']
+        self.weighted_score = totals['weighted_score']
 
         if self.weighted_score >= 10 or self.report_count >= 15:
             self.probability = 'high'
@@ -161,78 +286,174 @@ class Target(models.Model, GeoItem):
 
         self.save(update_fields=['report_count', 'weighted_score', 'probability'])
 
-    def _get_author_weight(self):
-        if hasattr(self.author, 'profile'):
-            rating = self.author.profile.trust_rating
-            return 1 + (rating / 10)
-        return 1.0
-
     def confirm(self):
-        from django.utils import timezone
-        self.status = 'confirmed'
-        self.resolved_at = timezone.now()
-        self.save(update_fields=['status', 'resolved_at'])
+        Target.resolve_many([self], 'confirmed')
+        self.refresh_from_db(fields=['status', 'resolved_at'])
+
+    def reject(self):
+        Target.resolve_many([self], 'rejected')
+        self.refresh_from_db(fields=['status', 'resolved_at'])
+
+    @classmethod
+    @instrument('resolve_targets')
+    def resolve_many(cls, targets, status):
+        """
+        Confirm or reject unconfirmed main targets together with all their
+        reports in one transaction, adjusting every author's rating by
+        +/-RATING_STEP per report. Targets that are no longer unconfirmed
+        are skipped. Returns the number of main targets resolved.
+        """
+        from users.models import UserProfile
+
+        amount = cls.RATING_STEP if status == 'confirmed' else -cls.RATING_STEP
+        if isinstance(targets, models.QuerySet):
+            ids = targets.values_list('pk', flat=True)
+        else:
+            ids = [target.pk for target in targets]
+
+        with transaction.atomic():
+            roots = list(
+                cls.objects.select_for_update()
+                .filter(pk__in=ids, status='unconfirmed')
+                .values_list('pk', 'notifications_sent', 'parent_target_id', 'latitude', 'longitude')
+            )
+            if not roots:
+                return 0
+            root_ids = [pk for pk, *_ in roots]
+            cluster = Q(pk__in=root_ids) | Q(parent_target_id__in=root_ids)
+
+            # Reports inside a resolved cluster describe the same threat
+            # as their main target and never get an alert of their own
+            now = timezone.now()
+            cls.objects.filter(parent_target_id__in=root_ids).update(
+                status=status, notifications_sent=True, updated_at=now
+            )
+            cls.objects.filter(pk__in=root_ids).update(status=status, resolved_at=now, updated_at=now)
+
+            reports_per_author = Counter(cls.objects.filter(cluster).values_list('author_id', flat=True))
+            authors_by_count = defaultdict(list)
+            for author_id, count in reports_per_author.items():
+                authors_by_count[count].append(author_id)
+            for count, author_ids in authors_by_count.items():
+                UserProfile.objects.filter(user_id__in=author_ids).update(
+                    trust_rating=Least(
+                        Value(5.0),
+                        Greatest(Value(-5.0), F('trust_rating') + amount * count),
+                    )
+                )
+
+            if status == 'confirmed':
+                unnotified = [pk for pk, notified, *_ in roots if not notified]
+                if unnotified:
+                    NotificationJob.objects.bulk_create([
+                        NotificationJob(kind='threat', target_id=pk) for pk in unnotified
+                    ])
+                    cls.objects.filter(pk__in=unnotified).update(notifications_sent=True)
+            else:
+                released = Counter()
+                for _, _, parent_id, latitude, longitude in roots:
+                    if parent_id is None:
+                        released.update(ThreatCounter.scopes_for(latitude, longitude))
+                ThreatCounter.adjust_many({scope: -count for scope, count in released.items()})
+
+            transaction.on_commit(lambda: cls._publish_resolution(root_ids, status))
+
+        return len(root_ids)
+
+    @classmethod
+    def _publish_resolution(cls, root_ids, status):
+        from .caching import bump_version
+        from .events import publish_resolved, publish_targets
+
+        bump_version('targets')
+        if status == 'confirmed':
+            publish_targets(cls.objects.filter(pk__in=root_ids).select_related('author'))
+        else:
+            publish_resolved(root_ids)
+
 
-        self._adjust_author_rating(0.25)
+@receiver(post_save, sender=Target)
+def index_target_location(sender, instance, **kwargs):
+    from .clustering import cluster_index
+    cluster_index.observe(instance)
 
-        for child in Target.objects.filter(parent_target=self):
-            child.status = 'confirmed'
-            child.save(update_fields=['status'])
-            child._adjust_author_rating(0.25)
 
-    def reject(self):
-        from django.utils import timezone
-        self.status = 'rejected'
-        self.resolved_at = timezone.now()
-        self.save(update_fields=['status', 'resolved_at'])
+@receiver(post_delete, sender=Target)
+def unindex_target(sender, instance, **kwargs):
+    from .clustering import cluster_index
+    cluster_index.forget(instance.pk)
+
 
-        self._adjust_author_rating(-0.25)
+@receiver(post_save, sender=Target)
+def publish_target_change(sender, instance, created, **kwargs):
+    from .events import is_on_map, publish_targets
+    # Reports that stay off the map, e.g. joining a cluster, are no news
+    if not created and not is_on_map(instance) and not instance.was_on_map:
+        return
+    transaction.on_commit(lambda: publish_targets([instance], created))
 
-        for child in Target.objects.filter(parent_target=self):
-            child.status = 'rejected'
-            child.save(update_fields=['status'])
-            child._adjust_author_rating(-0.25)
 
-    def _adjust_author_rating(self, amount):
-        if hasattr(self.author, 'profile'):
-            new_rating = self.author.profile.trust_rating + amount
-            self.author.profile.trust_rating = max(-5, min(5, new_rating))
-            self.author.profile.save(update_fields=['trust_rating'])
+@receiver(post_delete, sender=Target)
+def publish_target_delete(sender, instance, **kwargs):
+    from .events import publish_resolved
+    pk = instance.pk
+    transaction.on_commit(lambda: publish_resolved([pk]))
+
+
+@receiver(post_save, sender=Target)
+def invalidate_target_cache(sender, instance, created, **kwargs):
+    # Pending reports never appear in the public list, but a listed
+    # target moved back to pending must leave it. An unknown stored
+    # status counts as listed.
+    state = getattr(instance, '_stored_state', None)
+    was_pending = created or (state is not None and state[0] == 'pending')
+    if instance.status != 'pending' or not was_pending:
+        from .caching import bump_version
+        transaction.on_commit(lambda: bump_version('targets'))
+
+
+@receiver(post_delete, sender=Target)
+def invalidate_target_cache_on_delete(sender, instance, **kwargs):
+    from .caching import bump_version
+    transaction.on_commit(lambda: bump_version('targets'))
+
+
+@receiver(post_delete, sender=Target)
+def record_target_tombstone(sender, instance, **kwargs):
+    from .events import is_on_map
+    if is_on_map(instance):
+        TargetTombstone.objects.create(target_id=instance.pk)
+        TargetTombstone.objects.filter(
+            deleted_at__lt=timezone.now() - TargetTombstone.RETENTION
+        ).delete()
 
 
 @receiver(post_save, sender=Target)
 def notify_on_target_confirmed(sender, instance, created, **kwargs):
     if instance.status in ['confirmed', 'unconfirmed'] and not instance.notifications_sent:
-        from .notifications import notify_users_about_threat
-        notify_users_about_threat(instance)
+        from .outbox import enqueue_threat_alert
+        enqueue_threat_alert(instance)
         Target.objects.filter(pk=instance.pk).update(notifications_sent=True)
+        instance.notifications_sent = True
 
 
-_all_clear_check_in_progress = False
+@receiver(post_delete, sender=Target)
+def recount_threats_on_delete(sender, instance, **kwargs):
+    # Deleting a main target also detaches its reports (SET_NULL), which
+    # may turn them into main targets, so count again instead of adjusting
+    if instance.parent_target_id is None:
+        ThreatCounter.recount(ThreatCounter.scopes_for(instance.latitude, instance.longitude))
 
 
-@receiver(post_save, sender=Target)
-def check_all_clear_on_status_change(sender, instance, **kwargs):
-    global _all_clear_check_in_progress
-    if instance.status != 'confirmed' and not _all_clear_check_in_progress:
-        _all_clear_check_in_progress = True
-        try:
-            from .notifications import notify_all_clear
-            notify_all_clear()
-        finally:
-            _all_clear_check_in_progress = False
+class TargetTombstone(models.Model):
+    """Marks a map target that was deleted, for ?since= delta sync"""
+    RETENTION = timedelta(days=7)
 
+    target_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
-@receiver(post_delete, sender=Target)
-def check_all_clear_on_delete(sender, instance, **kwargs):
-    global _all_clear_check_in_progress
-    if instance.status == 'confirmed' and not _all_clear_check_in_progress:
-        _all_clear_check_in_progress = True
-        try:
-            from .notifications import notify_all_clear
-            notify_all_clear()
-        finally:
-            _all_clear_check_in_progress = False
+    def __str__(self):
+        return f"Deleted target #{self.target_id}"
 
 
 class Shelter(models.Model, GeoItem):
@@ -241,6 +462,28 @@ class Shelter(models.Model, GeoItem):
     capacity = models.IntegerField(default=0, help_text="Capacity (people)")
     latitude = models.FloatField()
     longitude = models.FloatField()
+    external_id = models.CharField(
+        max_length=100, unique=True, null=True, blank=True,
+        help_text="Identifier in the imported dataset (see datasets.import_shelters), generated when empty",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='shelter_lat_lon_idx'),
+        ]
+
+    @staticmethod
+    def generate_external_id() -> str:
+        return f"local:{uuid.uuid4().hex}"
+
+    def save(self, *args, **kwargs):
+        # Every shelter has a key, so an exported dataset re-imports onto
+        # the same rows instead of duplicating them
+        if not self.external_id:
+            self.external_id = self.generate_external_id()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = [*kwargs['update_fields'], 'external_id']
+        super().save(*args, **kwargs)
 
     @property
     def geomap_longitude(self):
@@ -251,4 +494,200 @@ class Shelter(models.Model, GeoItem):
         return str(self.latitude) if self.latitude else ''
 
     def __str__(self):
-        return f"Shelter: {self.title}"
\ No newline at end of file
+        return f"Shelter: {self.title}"
+
+
+class NotificationJob(models.Model):
+    """Outbox entry for an alert that still has to be delivered"""
+    KIND_CHOICES = (
+        ('threat', 'Threat alert'),
+        ('all_clear', 'All clear'),
+    )
+
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    target = models.ForeignKey(Target, on_delete=models.CASCADE, null=True, blank=True, related_name='notification_jobs')
+    # Region code of an all-clear job
+    scope = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['available_at']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_status_display()})"
+
+
+class AlertDelivery(models.Model):
+    """
+    A threat alert for one chat. Alerts wait a short window and go out
+    as one digest per chat (see coalescing). Rows are kept after sending
+    so a chat is never alerted about the same threat twice.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    chat_id = models.CharField(max_length=100)
+    target = models.ForeignKey(Target, on_delete=models.CASCADE, related_name='alert_deliveries')
+    distance = models.FloatField(help_text="Distance in km")
+    priority = models.FloatField(default=0, help_text="Higher is sent sooner (see coalescing.alert_priority)")
+    shelter = models.ForeignKey(
+        Shelter, on_delete=models.SET_NULL, null=True, blank=True, related_name='alert_deliveries',
+        help_text="Shelter suggested in the alert",
+    )
+    shelter_distance = models.FloatField(null=True, blank=True, help_text="Distance to the shelter in km")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    due_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['chat_id', 'target'], name='unique_alert_delivery'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'due_at']),
+            models.Index(fields=['chat_id', 'status']),
+            # Retention cleanup, see coalescing.delete_expired_alerts()
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"Alert for {self.chat_id} about #{self.target_id} ({self.get_status_display()})"
+
+
+class ThreatCounter(models.Model):
+    """
+    Number of active threats per Region code. Kept up to date on every
+    status change, so deciding whether to send the all-clear never has
+    to count targets. A region's all-clear is queued only when its count
+    drops to zero.
+    """
+    scope = models.CharField(max_length=64, unique=True)
+    active = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.scope}: {self.active} active"
+
+    @classmethod
+    def scopes_for(cls, latitude: float, longitude: float) -> set:
+        from .regions import region_code
+        return {region_code(latitude, longitude)}
+
+    @classmethod
+    def active_count(cls, scope) -> int:
+        return cls.objects.filter(scope=scope).values_list('active', flat=True).first() or 0
+
+    @classmethod
+    def adjust_many(cls, changes: dict):
+        """Apply {scope: delta} changes"""
+        with transaction.atomic():
+            # Lock in a fixed order so concurrent workers cannot deadlock
+            for scope in sorted(changes):
+                if changes[scope]:
+                    counter = cls._lock(scope)
+                    counter._store(max(0, counter.active + changes[scope]))
+
+    @classmethod
+    def recount(cls, scopes):
+        """Reset the counters of the given scopes from the targets table"""
+        from .regions import region_bounds, region_code
+
+        active = Target.objects.filter(parent_target__isnull=True, status__in=Target.ACTIVE_STATUSES)
+        with transaction.atomic():
+            for scope in sorted(scopes):
+                counter = cls._lock(scope)
+                min_lat, max_lat, min_lon, max_lon = region_bounds(scope)
+                points = active.filter(
+                    latitude__range=(min_lat - 0.01, max_lat + 0.01),
+                    longitude__range=(min_lon - 0.01, max_lon + 0.01),
+                ).values_list('latitude', 'longitude')
+                counter._store(sum(1 for point in points if region_code(*point) == scope))
+
+    @classmethod
+    def _lock(cls, scope):
+        # The row lock serializes concurrent workers, so exactly one of
+        # them sees the transition to zero
+        counter, _ = cls.objects.select_for_update().get_or_create(scope=scope)
+        return counter
+
+    def _store(self, active: int) -> int:
+        from .outbox import enqueue_all_clear
+
+        previous, self.active = self.active, active
+        self.save(update_fields=['active', 'updated_at'])
+        if previous > 0 and active == 0:
+            enqueue_all_clear(self.scope)
+        return active
+
+
+class Region(models.Model):
+    """
+    Alert zone: one cell of the geo.GRID_CELL_DEG grid. Regions are
+    created on demand; the name can be set in the admin.
+    """
+    code = models.CharField(max_length=32, unique=True)
+    name = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        ordering = ['code']
+
+    def __str__(self):
+        return self.name or f"Region {self.code}"
+
+
+class RegionMembership(models.Model):
+    """A subscriber receiving alerts from a region (see regions.assign_regions)"""
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, related_name='memberships')
+    profile = models.ForeignKey('users.UserProfile', on_delete=models.CASCADE, related_name='region_memberships')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['region', 'profile'], name='unique_region_membership'),
+        ]
+
+    def __str__(self):
+        return f"{self.profile} in {self.region}"
+
+
+@receiver(post_save, sender=Shelter)
+@receiver(post_delete, sender=Shelter)
+def invalidate_shelter_cache(sender, instance, signal, **kwargs):
+    from .caching import bump_version
+    from .shelters import shelter_index
+
+    pk, latitude, longitude, capacity = instance.pk, instance.latitude, instance.longitude, instance.capacity
+    deleted = signal is post_delete
+
+    def apply():
+        # The bumped version tells the index whether this was the only
+        # change since it was loaded or whether it has to reload
+        version = bump_version('shelters')
+        if deleted:
+            shelter_index.remove(pk, version)
+        else:
+            shelter_index.upsert(pk, latitude, longitude, capacity, version)
+
+    transaction.on_commit(apply)
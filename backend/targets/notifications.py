@@ -1,125 +1,140 @@
-import requests
-import math
-from django.conf import settings
+from backend.metrics import instrument
+from .dispatch import get_dispatcher
+from .geo import haversine_many
+from .regions import ALERT_RADIUS_KM, region_code
 
 
-def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """
-    Calculate the distance between two points on Earth using Haversine formula.
-    Returns distance in kilometers.
-    """
-    R = 6371  # Earth's radius in kilometers
+THREAT_NAMES = {
+    'drone': '🛸 DRON',
+    'rocket': '🚀 RAKIETA',
+    'plane': '✈️ SAMOLOT',
+    'helicopter': '🚁 ŚMIGŁOWIEC',
+    'bang': '💥 WYBUCH',
+}
+
 
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
+def shelter_line(shelter=None) -> str:
+    """Closing line of an alert, naming the (Shelter, distance) suggested if any"""
+    if shelter is None:
+        return "⚠️ Szukaj najbliższego schronienia!"
+    shelter, distance = shelter
+    place = f"{shelter.title}, {shelter.address}" if shelter.address else shelter.title
+    return f"🏠 Najbliższy schron: {place} ({distance:.1f} km)"
+
+
+def threat_message(target, distance: float, shelter=None) -> str:
+    threat_name = THREAT_NAMES.get(target.target_type, '⚠️ ZAGROŻENIE')
+    return (
+        f"🚨 <b>ZAGROŻENIE Z POWIETRZA!</b> 🚨\n\n"
+        f"Typ: {threat_name}\n"
+        f"Odległość: {distance:.1f} km od Twojej lokalizacji\n"
+        f"Opis: {target.title}\n\n"
+        f"{shelter_line(shelter)}"
+    )
 
-    a = math.sin(delta_lat / 2) ** 2 + \
-        math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
-    return R * c
+# Keeps digests well under Telegram's 4096 character limit
+MAX_DIGEST_ITEMS = 20
 
 
-def send_telegram_notification(chat_id: str, message: str) -> bool:
+def digest_message(alerts, shelter=None) -> str:
     """
-    Send a notification to a Telegram user.
-    Returns True if successful, False otherwise.
+    One message for several threats, given (target, distance) pairs and
+    the (Shelter, distance) suggested to the chat
     """
-    bot_token = getattr(settings, 'TELEGRAM_BOT_TOKEN', None)
-    
-    if not bot_token:
-        print("Warning: TELEGRAM_BOT_TOKEN not configured")
-        return False
-    
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    
-    payload = {
-        'chat_id': chat_id,
-        'text': message,
-        'parse_mode': 'HTML'
-    }
-    
-    try:
-        response = requests.post(url, json=payload, timeout=10)
-        result = response.json()
-        return response.status_code == 200 and result.get('ok', False)
-    except requests.RequestException as e:
-        print(f"Error sending Telegram notification: {e}")
-        return False
+    if len(alerts) == 1:
+        return threat_message(*alerts[0], shelter=shelter)
+    lines = [
+        f"• {THREAT_NAMES.get(target.target_type, '⚠️ ZAGROŻENIE')} – {distance:.1f} km – {target.title[:60]}"
+        for target, distance in alerts[:MAX_DIGEST_ITEMS]
+    ]
+    if len(alerts) > MAX_DIGEST_ITEMS:
+        lines.append(f"… i {len(alerts) - MAX_DIGEST_ITEMS} więcej")
+    return (
+        f"🚨 <b>ZAGROŻENIA Z POWIETRZA ({len(alerts)})!</b> 🚨\n\n"
+        + "\n".join(lines)
+        + "\n\n" + shelter_line(shelter)
+    )
 
 
+@instrument('notify_users_about_threat')
 def notify_users_about_threat(target) -> int:
     """
-    Notify all users within 30km radius about a new threat.
-    Returns the number of users notified.
+    Queue alerts about a new threat for all users within 30km radius,
+    each with a nearby shelter that still has room (see
+    shelters.assign_shelters). They are sent by
+    coalescing.flush_alerts() as one digest per chat.
+    Returns the number of alerts queued.
     """
+    from users.locations import apply_pending_locations, flush_locations
     from users.models import UserProfile
+    from .coalescing import buffer_alerts
+    from .shelters import assign_shelters
     
-    ALERT_RADIUS_KM = 30
-    notified_count = 0
+    # Locations are buffered (see users.locations), write the newest first
+    flush_locations()
     
-    # Get all users with location and telegram configured
+    # Subscribers of the target's region are everyone whose alert radius
+    # may reach it (see regions.assign_regions); the exact distance is
+    # checked below
     users_with_location = UserProfile.objects.filter(
-        last_latitude__isnull=False,
-        last_longitude__isnull=False,
+        region_memberships__region__code=region_code(target.latitude, target.longitude),
         telegram_chat_id__isnull=False,
         notifications_enabled=True
-    ).exclude(telegram_chat_id='')
-    
-    threat_types = {
-        'drone': '🛸 DRON',
-        'rocket': '🚀 RAKIETA',
-        'plane': '✈️ SAMOLOT',
-        'helicopter': '🚁 ŚMIGŁOWIEC',
-        'bang': '💥 WYBUCH',
-    }
+    ).exclude(telegram_chat_id='').only(
+        'last_latitude', 'last_longitude', 'telegram_chat_id'
+    )
     
-    threat_name = threat_types.get(target.target_type, '⚠️ ZAGROŻENIE')
+    profiles = list(users_with_location)
+    # Another process may still be flushing, use buffered positions as well
+    apply_pending_locations(profiles)
+    distances = haversine_many(
+        target.latitude, target.longitude,
+        [p.last_latitude for p in profiles],
+        [p.last_longitude for p in profiles],
+    )
     
-    for profile in users_with_location:
-        distance = haversine_distance(
-            profile.last_latitude,
-            profile.last_longitude,
-            target.latitude,
-            target.longitude
-        )
-        
-        if distance <= ALERT_RADIUS_KM:
-            message = (
-                f"🚨 <b>ZAGROŻENIE Z POWIETRZA!</b> 🚨\n\n"
-                f"Typ: {threat_name}\n"
-                f"Odległość: {distance:.1f} km od Twojej lokalizacji\n"
-                f"Opis: {target.title}\n\n"
-                f"⚠️ Szukaj najbliższego schronienia!"
-            )
-            
-            if send_telegram_notification(profile.telegram_chat_id, message):
-                notified_count += 1
+    nearby = [
+        (profile, float(distance))
+        for profile, distance in zip(profiles, distances)
+        if distance <= ALERT_RADIUS_KM
+    ]
+    shelter_pks, shelter_distances = assign_shelters(
+        [profile.last_latitude for profile, _ in nearby],
+        [profile.last_longitude for profile, _ in nearby],
+    )
+    recipients = [(profile.telegram_chat_id, distance) for profile, distance in nearby]
+    shelters = {
+        profile.telegram_chat_id: (int(shelter_pk), float(shelter_distance))
+        for (profile, _), shelter_pk, shelter_distance in zip(nearby, shelter_pks, shelter_distances)
+        if shelter_pk >= 0
+    }
     
-    return notified_count
+    return buffer_alerts(target, recipients, shelters)
 
 
-def notify_all_clear() -> int:
+@instrument('notify_all_clear')
+def notify_all_clear(scopes) -> int:
     """
-    Notify all users that all threats have been cleared.
+    Notify the subscribers of regions whose threats have been cleared,
+    once per chat however many of their regions cleared. Subscribers who
+    still have an active threat in another of their regions are skipped.
     Returns the number of users notified.
     """
     from users.models import UserProfile
-    from .models import Target
+    from .models import ThreatCounter
     
-    # Check if there are any active confirmed threats
-    active_threats = Target.objects.filter(status='confirmed').count()
-    if active_threats > 0:
+    active_regions = set(ThreatCounter.objects.filter(active__gt=0).values_list('scope', flat=True))
+    # A new threat may have appeared since the all-clears were queued
+    cleared = set(scopes) - active_regions
+    if not cleared:
         return 0
     
-    notified_count = 0
-    
     users_with_telegram = UserProfile.objects.filter(
         telegram_chat_id__isnull=False,
-        notifications_enabled=True
-    ).exclude(telegram_chat_id='')
+        notifications_enabled=True,
+        region_memberships__region__code__in=cleared,
+    ).exclude(telegram_chat_id='').exclude(region_memberships__region__code__in=active_regions)
     
     message = (
         "✅ <b>ALARM ODWOŁANY</b> ✅\n\n"
@@ -128,8 +143,6 @@ def notify_all_clear() -> int:
         "🛡️ Dziękujemy za korzystanie z SkyGuard!"
     )
     
-    for profile in users_with_telegram:
-        if send_telegram_notification(profile.telegram_chat_id, message):
-            notified_count += 1
-    
-    return notified_count
+    chat_ids = users_with_telegram.values_list('telegram_chat_id', flat=True).distinct()
+    results = get_dispatcher().send_many((chat_id, message) for chat_id in chat_ids)
+    return sum(1 for result in results if result.ok)
@@ -0,0 +1,132 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import NotificationJob
+
+logger = logging.getLogger(__name__)
+
+# A job stuck in "processing" longer than this is assumed to belong to a
+# dead worker and may be claimed again
+STALE_LOCK_TIMEOUT = timedelta(minutes=10)
+MAX_ATTEMPTS = 5
+
+
+def enqueue_threat_alert(target) -> NotificationJob:
+    """Queue a threat alert for the given target"""
+    return NotificationJob.objects.create(kind='threat', target=target)
+
+
+def enqueue_all_clear(scope: str = ''):
+    """
+    Queue an all-clear check for a region unless one is already waiting.
+    Whether the message is actually sent is decided at delivery time.
+    """
+    if NotificationJob.objects.filter(kind='all_clear', scope=scope, status='pending').exists():
+        return None
+    return NotificationJob.objects.create(kind='all_clear', scope=scope)
+
+
+def claim_jobs(batch_size: int = 10, kind: str = None) -> list:
+    """
+    Lock and mark up to batch_size (None: all) due jobs, optionally of one
+    kind, as processing. Rows locked by other workers are skipped, so
+    concurrent workers never claim the same job.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = NotificationJob.objects.select_for_update(skip_locked=True).filter(
+            Q(status='pending', available_at__lte=now) |
+            Q(status='processing', locked_at__lt=now - STALE_LOCK_TIMEOUT)
+        )
+        if kind is not None:
+            due = due.filter(kind=kind)
+        due = due.order_by('available_at')
+        jobs = list(due if batch_size is None else due[:batch_size])
+        if jobs:
+            NotificationJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status='processing',
+                locked_at=now,
+                attempts=F('attempts') + 1,
+            )
+    return jobs
+
+
+def deliver_jobs(jobs: list) -> int:
+    """
+    Run the notification described by claimed jobs of one kind: a single
+    threat job, or any number of all-clear jobs delivered together.
+    A threat job whose target was rejected, merged or deleted since it was
+    queued sends nothing.
+    """
+    from .models import Target
+    from .notifications import notify_users_about_threat, notify_all_clear
+
+    kind = jobs[0].kind
+    if kind == 'threat':
+        [job] = jobs
+        target = Target.objects.filter(pk=job.target_id).first()
+        if target is None or not target.is_active_threat:
+            return 0
+        return notify_users_about_threat(target)
+    if kind == 'all_clear':
+        return notify_all_clear([job.scope for job in jobs])
+    raise ValueError(f"Unknown notification job kind: {kind}")
+
+
+def process_jobs(jobs: list) -> bool:
+    """
+    Deliver claimed jobs (see deliver_jobs) and record the outcome.
+    Failed jobs are retried with exponential backoff up to MAX_ATTEMPTS.
+    """
+    try:
+        deliver_jobs(jobs)
+    except Exception as e:
+        for job in jobs:
+            attempts = job.attempts + 1
+            logger.exception(
+                "Notification job failed",
+                extra={'job_id': job.pk, 'kind': job.kind, 'attempts': attempts},
+            )
+            if attempts >= MAX_ATTEMPTS:
+                NotificationJob.objects.filter(pk=job.pk).update(
+                    status='failed', last_error=str(e), finished_at=timezone.now()
+                )
+            else:
+                NotificationJob.objects.filter(pk=job.pk).update(
+                    status='pending',
+                    last_error=str(e),
+                    locked_at=None,
+                    available_at=timezone.now() + timedelta(seconds=2 ** attempts),
+                )
+        return False
+
+    NotificationJob.objects.filter(pk__in=[job.pk for job in jobs]).update(status='done', finished_at=timezone.now())
+    return True
+
+
+def run_once(batch_size: int = 10) -> int:
+    """
+    Claim and process one batch of jobs, then send the alerts that are
+    due and write buffered user locations when due. Returns the number
+    of jobs and messages handled.
+    """
+    from users.locations import flush_if_due
+    from .coalescing import flush_alerts
+
+    flush_if_due()
+
+    jobs = claim_jobs(batch_size)
+    all_clears = [job for job in jobs if job.kind == 'all_clear']
+    for job in jobs:
+        if job.kind != 'all_clear':
+            process_jobs([job])
+    if all_clears:
+        # Regions cleared together, e.g. by one bulk resolve, are
+        # delivered together so each chat gets a single all-clear
+        all_clears += claim_jobs(None, kind='all_clear')
+        process_jobs(all_clears)
+    return len(jobs) + flush_alerts()
@@ -0,0 +1,63 @@
+from django.db import transaction
+
+from .geo import GRID_CELL_DEG, grid_cell, grid_cells_in_radius
+
+# Subscribers are alerted about threats within this distance
+ALERT_RADIUS_KM = 30
+
+
+def region_code(latitude: float, longitude: float) -> str:
+    """Code of the region (grid cell) containing the point"""
+    return grid_cell(latitude, longitude)
+
+
+def region_bounds(code: str):
+    """Return (min_lat, max_lat, min_lon, max_lon) of a region"""
+    row, col = (int(part) for part in code.split(':'))
+    return (
+        row * GRID_CELL_DEG,
+        (row + 1) * GRID_CELL_DEG,
+        col * GRID_CELL_DEG,
+        (col + 1) * GRID_CELL_DEG,
+    )
+
+
+def ensure_regions(codes) -> dict:
+    """Create missing regions and return {code: Region}"""
+    from .models import Region
+
+    codes = set(codes)
+    if not codes:
+        return {}
+    Region.objects.bulk_create([Region(code=code) for code in codes], ignore_conflicts=True)
+    return {region.code: region for region in Region.objects.filter(code__in=codes)}
+
+
+def assign_regions(profile):
+    """
+    Precompute the regions a subscriber gets alerts from: every region
+    touched by the ALERT_RADIUS_KM circle around their last location.
+    Usually the set is unchanged and this costs a single query.
+    """
+    from .models import RegionMembership
+
+    if profile.last_latitude is None or profile.last_longitude is None:
+        codes = set()
+    else:
+        codes = set(grid_cells_in_radius(profile.last_latitude, profile.last_longitude, ALERT_RADIUS_KM))
+
+    memberships = profile.region_memberships.all()
+    current = dict(memberships.values_list('region__code', 'pk'))
+    if current.keys() == codes:
+        return
+
+    with transaction.atomic():
+        stale = [pk for code, pk in current.items() if code not in codes]
+        if stale:
+            memberships.filter(pk__in=stale).delete()
+        missing = codes - current.keys()
+        if missing:
+            RegionMembership.objects.bulk_create([
+                RegionMembership(region=region, profile=profile)
+                for region in ensure_regions(missing).values()
+            ], ignore_conflicts=True)
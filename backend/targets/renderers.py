@@ -0,0 +1,92 @@
+import struct
+
+import numpy as np
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+
+from .models import Target
+
+MAP_FIELDS = ('id', 'latitude', 'longitude', 'target_type', 'danger_radius', 'probability', 'status')
+
+# Enum columns are sent as indexes into these lists
+MAP_ENUMS = {
+    'target_type': [value for value, _ in Target.TYPE_CHOICES],
+    'probability': [value for value, _ in Target.PROBABILITY_CHOICES],
+    'status': [value for value, _ in Target.STATUS_CHOICES],
+}
+
+PACKED_MAGIC = b'SGM1'
+
+
+def map_columns(queryset) -> dict:
+    """
+    Read the fields the map needs straight from the database and return
+    them column by column, without building serializer objects per row.
+    """
+    rows = list(queryset.values_list(*MAP_FIELDS))
+    columns = {name: [row[i] for row in rows] for i, name in enumerate(MAP_FIELDS)}
+    for name, values in MAP_ENUMS.items():
+        codes = {value: code for code, value in enumerate(values)}
+        columns[name] = [codes.get(value, 0) for value in columns[name]]
+    return {'count': len(rows), 'enums': MAP_ENUMS, **columns}
+
+
+def pack_map(columns: dict) -> bytes:
+    """
+    Binary layout (little endian): b"SGM1", uint32 count, then one array
+    per column: uint32 id, float32 latitude, float32 longitude, and
+    uint8 target_type, danger_radius, probability, status.
+    Enum codes index the lists in MAP_ENUMS.
+    """
+    parts = [PACKED_MAGIC, struct.pack('<I', columns['count'])]
+    parts.append(np.asarray(columns['id'], dtype='<u4').tobytes())
+    parts.append(np.asarray(columns['latitude'], dtype='<f4').tobytes())
+    parts.append(np.asarray(columns['longitude'], dtype='<f4').tobytes())
+    for name in ('target_type', 'danger_radius', 'probability', 'status'):
+        parts.append(np.asarray(columns[name], dtype='u1').tobytes())
+    return b''.join(parts)
+
+
+class CompactMapRenderer(JSONRenderer):
+    """Array-of-columns JSON, selected by ?format=compact or its media type"""
+    media_type = 'application/vnd.skyguard.map+json'
+    format = 'compact'
+
+
+class PackedMapRenderer(BaseRenderer):
+    """Fixed-width binary columns, selected by ?format=packed or its media type"""
+    media_type = 'application/vnd.skyguard.map+octet-stream'
+    format = 'packed'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and 'count' in data and 'id' in data:
+            return pack_map(data)
+        # Errors and other non-map payloads fall back to JSON
+        json_renderer = JSONRenderer()
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = json_renderer.media_type
+        return json_renderer.render(data, renderer_context=renderer_context)
+
+
+MAP_RENDERER_FORMATS = (CompactMapRenderer.format, PackedMapRenderer.format)
+
+
+class MapFormatMixin:
+    """
+    Lets list views answer with map_columns() when a compact map renderer
+    was negotiated, and with the regular serializer otherwise.
+    """
+
+    def get_renderers(self):
+        return [*super().get_renderers(), CompactMapRenderer(), PackedMapRenderer()]
+
+    def uses_map_format(self) -> bool:
+        return self.request.accepted_renderer.format in MAP_RENDERER_FORMATS
+
+    def list(self, request, *args, **kwargs):
+        if self.uses_map_format():
+            return Response(map_columns(self.filter_queryset(self.get_queryset())))
+        return super().list(request, *args, **kwargs)
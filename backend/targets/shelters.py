@@ -0,0 +1,386 @@
+import math
+import threading
+import time
+
+import numpy as np
+
+from django.conf import settings
+
+from .geo import EARTH_RADIUS_KM, haversine_cross, haversine_many
+
+# Cell size of the shelter grid in degrees (~11 km north-south)
+SHELTER_CELL_DEG = 0.1
+
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+
+# How often lookups check the shared data version for changes made by
+# other processes, in seconds
+VERSION_CHECK_INTERVAL = 1.0
+
+# Candidate shelters considered per person when assigning by capacity
+ASSIGNMENT_CANDIDATES = 8
+
+# Shelters whose distances cost about as much to compute as looking up
+# one grid cell, see ShelterIndex._ring_limit()
+SCAN_SHELTERS_PER_CELL = 32
+
+# Entries of one recipients x shelters distance matrix, keeps memory
+# bounded in dense cells
+ASSIGNMENT_MATRIX_SIZE = 1 << 20
+
+
+class ShelterIndex:
+    """
+    In-memory grid of shelter positions and capacities for k-nearest
+    lookups. Saves and deletes in this process are applied one by one
+    (see the Shelter receivers); when the 'shelters' data version moved
+    on in another process, the whole index is reloaded by the first
+    lookup after VERSION_CHECK_INTERVAL.
+    """
+
+    def __init__(self, cell_deg=SHELTER_CELL_DEG):
+        self.cell_deg = cell_deg
+        self._lock = threading.Lock()
+        self._cells = {}
+        self._arrays = {}
+        self._entries = {}
+        self._all = None
+        self._bounds = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def _cell(self, latitude, longitude):
+        return math.floor(latitude / self.cell_deg), math.floor(longitude / self.cell_deg)
+
+    def _add(self, pk, latitude, longitude, capacity):
+        self._remove(pk)
+        cell = self._cell(latitude, longitude)
+        self._cells.setdefault(cell, {})[pk] = (latitude, longitude, capacity)
+        self._entries[pk] = cell
+        self._arrays.pop(cell, None)
+        self._all = None
+        # Only ever grows, which merely lets a search run a ring longer
+        if self._bounds is None:
+            self._bounds = (cell[0], cell[0], cell[1], cell[1])
+        else:
+            min_row, max_row, min_col, max_col = self._bounds
+            self._bounds = (min(min_row, cell[0]), max(max_row, cell[0]), min(min_col, cell[1]), max(max_col, cell[1]))
+
+    def _remove(self, pk):
+        cell = self._entries.pop(pk, None)
+        if cell is None:
+            return
+        shelters = self._cells[cell]
+        del shelters[pk]
+        if not shelters:
+            del self._cells[cell]
+        self._arrays.pop(cell, None)
+        self._all = None
+
+    def _cell_arrays(self, cell):
+        """(ids, latitudes, longitudes, capacities) of a cell, or None when empty"""
+        arrays = self._arrays.get(cell)
+        if arrays is None:
+            shelters = self._cells.get(cell)
+            if not shelters:
+                return None
+            values = np.array(list(shelters.values()), dtype=np.float64)
+            arrays = self._arrays[cell] = (
+                np.fromiter(shelters.keys(), dtype=np.int64, count=len(shelters)),
+                values[:, 0], values[:, 1], values[:, 2],
+            )
+        return arrays
+
+    def _all_arrays(self):
+        """(ids, latitudes, longitudes, capacities) of every shelter"""
+        if self._all is None:
+            parts = [self._cell_arrays(cell) for cell in self._cells]
+            self._all = tuple(np.concatenate(column) for column in zip(*parts))
+        return self._all
+
+    def _covering_ring(self, row, col):
+        """Ring around (row, col) that reaches every occupied cell"""
+        min_row, max_row, min_col, max_col = self._bounds
+        return max(row - min_row, max_row - row, col - min_col, max_col - col)
+
+    def _ring_limit(self):
+        """
+        Rings a search visits before it scans all shelters instead. A
+        cell visit costs about as much as the distances to
+        SCAN_SHELTERS_PER_CELL shelters, so points far from every
+        shelter, or queries no shelter satisfies, cost one vectorised
+        scan instead of a sweep over thousands of empty cells.
+        """
+        return math.isqrt(len(self._entries) // SCAN_SHELTERS_PER_CELL) // 2 + 2
+
+    def _reset(self):
+        self._cells.clear()
+        self._arrays.clear()
+        self._entries.clear()
+        self._all = None
+        self._bounds = None
+
+    def _load(self, version):
+        from .models import Shelter
+
+        self._reset()
+        for pk, latitude, longitude, capacity in Shelter.objects.values_list('pk', 'latitude', 'longitude', 'capacity'):
+            self._add(pk, latitude, longitude, capacity)
+        self._version = version
+
+    def _ensure_current(self):
+        from .caching import get_version
+
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return
+        version = get_version('shelters')
+        if version != self._version:
+            self._load(version)
+        self._checked_at = now
+
+    def upsert(self, pk, latitude, longitude, capacity, version):
+        """Apply a saved shelter; version is the data version its save produced"""
+        with self._lock:
+            if self._version is not None and version == self._version + 1:
+                self._add(pk, latitude, longitude, capacity)
+                self._version = version
+            else:
+                self._version = None
+
+    def remove(self, pk, version):
+        with self._lock:
+            if self._version is not None and version == self._version + 1:
+                self._remove(pk)
+                self._version = version
+            else:
+                self._version = None
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._version = None
+
+    def nearest(self, latitude: float, longitude: float, k: int = 1, min_capacity: int = 0) -> list:
+        """
+        Up to k (shelter pk, distance km) pairs closest to the point,
+        nearest first, skipping shelters below min_capacity.
+        """
+        with self._lock:
+            self._ensure_current()
+            if not self._cells or k < 1:
+                return []
+
+            row, col = self._cell(latitude, longitude)
+            covering = self._covering_ring(row, col)
+            max_ring = min(covering, self._ring_limit())
+
+            ids, latitudes, longitudes = [], [], []
+            distances = np.empty(0)
+            found = 0
+            complete = False
+            for ring in range(max_ring + 1):
+                for cell in self._ring(row, col, ring):
+                    arrays = self._cell_arrays(cell)
+                    if arrays is None:
+                        continue
+                    cell_ids, cell_latitudes, cell_longitudes, capacities = arrays
+                    if min_capacity:
+                        keep = capacities >= min_capacity
+                        cell_ids, cell_latitudes, cell_longitudes = cell_ids[keep], cell_latitudes[keep], cell_longitudes[keep]
+                    ids.append(cell_ids)
+                    latitudes.append(cell_latitudes)
+                    longitudes.append(cell_longitudes)
+                    found += len(cell_ids)
+
+                if found < k:
+                    continue
+                # One vectorised distance computation per ring
+                ids = [np.concatenate(ids)]
+                distances = np.concatenate([
+                    distances, haversine_many(latitude, longitude, np.concatenate(latitudes), np.concatenate(longitudes))
+                ])
+                latitudes, longitudes = [], []
+                # Everything beyond this ring is at least `ring` whole cells
+                # away, measured along the narrower longitude axis
+                kth = np.partition(distances, k - 1)[k - 1]
+                widest = math.radians(min(abs(latitude) + (ring + 1) * self.cell_deg, 89.9))
+                if kth <= ring * self.cell_deg * KM_PER_DEG * math.cos(widest):
+                    complete = True
+                    break
+
+            if not complete and max_ring < covering:
+                return self._scan(latitude, longitude, k, min_capacity)
+            if latitudes:
+                distances = np.concatenate([
+                    distances, haversine_many(latitude, longitude, np.concatenate(latitudes), np.concatenate(longitudes))
+                ])
+            if not len(distances):
+                return []
+            ids = np.concatenate(ids)
+            order = np.argsort(distances)[:k]
+            return [(int(ids[i]), float(distances[i])) for i in order]
+
+    def _scan(self, latitude, longitude, k, min_capacity):
+        """nearest() by distances to every shelter"""
+        ids, latitudes, longitudes, capacities = self._all_arrays()
+        if min_capacity:
+            keep = capacities >= min_capacity
+            ids, latitudes, longitudes = ids[keep], latitudes[keep], longitudes[keep]
+        distances = haversine_many(latitude, longitude, latitudes, longitudes)
+        if k < len(distances):
+            nearest = np.argpartition(distances, k - 1)[:k]
+        else:
+            nearest = np.arange(len(distances))
+        order = nearest[np.argsort(distances[nearest])]
+        return [(int(ids[i]), float(distances[i])) for i in order]
+
+    def _neighbourhood(self, row, col, k, deadline):
+        """
+        Shelters in the cells around (row, col), widening the square
+        until it holds at least k of them, or only one after the
+        time.perf_counter() deadline. All shelters when it would have to
+        grow past _ring_limit() rings.
+        """
+        covering = self._covering_ring(row, col)
+        max_ring = min(covering, self._ring_limit())
+        parts = []
+        found = 0
+        for ring in range(max_ring + 1):
+            for cell in self._ring(row, col, ring):
+                arrays = self._cell_arrays(cell)
+                if arrays is not None:
+                    parts.append(arrays)
+                    found += len(arrays[0])
+            if ring >= 1 and (found >= k or (found and time.perf_counter() > deadline)):
+                break
+        else:
+            if max_ring < covering:
+                return self._all_arrays()
+        return tuple(np.concatenate(column) for column in zip(*parts))
+
+    def candidates(self, latitudes, longitudes, k: int, deadline: float):
+        """
+        Up to k nearby shelters per point as (pks, distances, capacities)
+        N x k arrays ordered nearest first; missing candidates have pk -1
+        and an infinite distance. Points not reached before the
+        time.perf_counter() deadline only get their nearest shelter.
+        """
+        n = len(latitudes)
+        pks = np.full((n, k), -1, dtype=np.int64)
+        distances = np.full((n, k), np.inf)
+        capacities = np.zeros((n, k))
+
+        with self._lock:
+            self._ensure_current()
+            if not self._cells or not n:
+                return pks, distances, capacities
+
+            # Points in the same cell share their candidate shelters
+            rows = np.floor(latitudes / self.cell_deg).astype(np.int64)
+            cols = np.floor(longitudes / self.cell_deg).astype(np.int64)
+            keys = (rows << 32) + cols
+            order = np.argsort(keys, kind='stable')
+            sorted_keys = keys[order]
+            starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+            groups = np.split(order, starts[1:])
+            unique_cells = zip(rows[order[starts]], cols[order[starts]])
+
+            for (row, col), members in zip(unique_cells, groups):
+                shelters = self._neighbourhood(int(row), int(col), k, deadline)
+                shelter_pks, shelter_latitudes, shelter_longitudes, shelter_capacities = shelters
+                # Bounds the memory of one distance matrix
+                chunk_size = max(1, ASSIGNMENT_MATRIX_SIZE // len(shelter_pks))
+                for start in range(0, len(members), chunk_size):
+                    chunk = members[start:start + chunk_size]
+                    take = min(k if time.perf_counter() < deadline else 1, len(shelter_pks))
+                    matrix = haversine_cross(latitudes[chunk], longitudes[chunk], shelter_latitudes, shelter_longitudes)
+                    if take < len(shelter_pks):
+                        nearest = np.argpartition(matrix, take - 1, axis=1)[:, :take]
+                    else:
+                        nearest = np.broadcast_to(np.arange(take), (len(chunk), take))
+                    nearest_distances = np.take_along_axis(matrix, nearest, axis=1)
+                    by_distance = np.argsort(nearest_distances, axis=1)
+                    nearest = np.take_along_axis(nearest, by_distance, axis=1)
+                    pks[chunk, :take] = shelter_pks[nearest]
+                    distances[chunk, :take] = np.take_along_axis(nearest_distances, by_distance, axis=1)
+                    capacities[chunk, :take] = shelter_capacities[nearest]
+        return pks, distances, capacities
+
+    @staticmethod
+    def _ring(row, col, ring):
+        """Cells at Chebyshev distance ring from (row, col)"""
+        if ring == 0:
+            yield row, col
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield row - ring, c
+            yield row + ring, c
+        for r in range(row - ring + 1, row + ring):
+            yield r, col - ring
+            yield r, col + ring
+
+
+shelter_index = ShelterIndex()
+
+
+def assign_shelters(latitudes, longitudes, k: int = ASSIGNMENT_CANDIDATES, budget: float = None):
+    """
+    Assign each point (a person) to one of its k nearest shelters without
+    exceeding shelter capacities, as (shelter pks, distances km) arrays
+    with pk -1 where no shelter was found.
+
+    Greedy in rounds: everyone still unassigned asks for their next
+    nearest candidate and each shelter admits the closest askers up to
+    its remaining capacity. People whose candidates are all full, or who
+    were not placed within the time budget (SHELTER_ASSIGNMENT_BUDGET
+    seconds), get their nearest shelter regardless of capacity. Past the
+    budget only that nearest shelter is still looked up for everyone
+    left, so the run can take somewhat longer than the budget.
+    """
+    if budget is None:
+        budget = getattr(settings, 'SHELTER_ASSIGNMENT_BUDGET', 0.5)
+    deadline = time.perf_counter() + budget
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    n = len(latitudes)
+
+    pks, distances, capacities = shelter_index.candidates(latitudes, longitudes, k, deadline)
+    found = pks >= 0
+    # Candidate pks as slots in one array of remaining capacities
+    used = np.zeros(max(int(pks.max(initial=-1)), 0) + 1, dtype=bool)
+    used[pks[found]] = True
+    lookup = np.cumsum(used) - 1
+    candidate_slots = np.where(found, lookup[np.maximum(pks, 0)], -1)
+    remaining = np.zeros(int(used.sum()), dtype=np.int64)
+    remaining[candidate_slots[found]] = capacities[found]
+
+    choice = np.zeros(n, dtype=np.int64)
+    assigned = np.full(n, -1, dtype=np.int64)
+    waiting = np.flatnonzero(found[:, 0])
+    while len(waiting) and time.perf_counter() < deadline:
+        slot = candidate_slots[waiting, choice[waiting]]
+        # Group the asks by shelter, closest first (distances stay far
+        # below the slot multiplier)
+        order = np.argsort(slot * 1e5 + distances[waiting, choice[waiting]])
+        slot = slot[order]
+        # Position of each ask among the asks for the same shelter
+        rank = np.arange(len(slot)) - np.searchsorted(slot, slot)
+        admitted = rank < remaining[slot]
+        assigned[waiting[order[admitted]]] = choice[waiting[order[admitted]]]
+        remaining -= np.bincount(slot[admitted], minlength=len(remaining))
+
+        waiting = waiting[order[~admitted]]
+        choice[waiting] += 1
+        has_next = choice[waiting] < k
+        has_next[has_next] = candidate_slots[waiting[has_next], choice[waiting[has_next]]] >= 0
+        waiting = waiting[has_next]
+
+    overflow = found[:, 0] & (assigned < 0)
+    assigned[overflow] = 0
+    rows = np.flatnonzero(assigned >= 0)
+    result_pks = np.full(n, -1, dtype=np.int64)
+    result_distances = np.full(n, np.nan)
+    result_pks[rows] = pks[rows, assigned[rows]]
+    result_distances[rows] = distances[rows, assigned[rows]]
+    return result_pks, result_distances
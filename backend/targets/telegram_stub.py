@@ -0,0 +1,94 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class TelegramStubServer:
+    """
+    Minimal local stand-in for api.telegram.org.
+    Accepts sendMessage calls, records them and answers like Telegram.
+    Point TELEGRAM_API_URL (or TelegramDispatcher(api_url=...)) at self.url.
+
+    latency: seconds to wait before answering each request
+    rate_limit_every: answer every N-th request with 429 and retry_after
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, rate_limit_every=0, retry_after=1):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.messages = []
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    payload = {}
+
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                with stub._lock:
+                    stub.request_count += 1
+                    limited = stub.rate_limit_every and stub.request_count % stub.rate_limit_every == 0
+                    if not limited and self.path.endswith('/sendMessage'):
+                        stub.messages.append({
+                            'chat_id': str(payload.get('chat_id')),
+                            'text': payload.get('text', ''),
+                            'received_at': time.monotonic(),
+                        })
+                    message_id = len(stub.messages)
+
+                if limited:
+                    self._reply(429, {
+                        'ok': False,
+                        'error_code': 429,
+                        'description': f'Too Many Requests: retry after {stub.retry_after}',
+                        'parameters': {'retry_after': stub.retry_after},
+                    })
+                else:
+                    self._reply(200, {'ok': True, 'result': {'message_id': message_id}})
+
+            def _reply(self, code, body):
+                data = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
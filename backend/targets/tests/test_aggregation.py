@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from targets.models import Target
+from users.models import UserProfile
+
+
+class UpdateAggregationQueriesTest(TestCase):
+    """update_aggregation() costs the same queries for any cluster size"""
+
+    def make_cluster(self, size: int) -> Target:
+        authors = User.objects.bulk_create([
+            User(username=f"aggregation-{size}-{i}") for i in range(size + 1)
+        ])
+        # bulk_create() skips save(), so nothing aggregates on its own
+        [main] = Target.objects.bulk_create([
+            Target(title='DRONE', latitude=52.0, longitude=21.0, target_type='drone',
+                   status='unconfirmed', author=authors[0])
+        ])
+        Target.objects.bulk_create([
+            Target(title='DRONE', latitude=52.0, longitude=21.0, target_type='drone',
+                   status='unconfirmed', author=author, parent_target=main)
+            for author in authors[1:]
+        ])
+        return main
+
+    def test_queries_do_not_grow_with_cluster_size(self):
+        small = self.make_cluster(3)
+        with CaptureQueriesContext(connection) as queries:
+            small.update_aggregation()
+        self.assertEqual(small.report_count, 4)
+
+        large = self.make_cluster(40)
+        with self.assertNumQueries(len(queries)):
+            large.update_aggregation()
+        self.assertEqual(large.report_count, 41)
+
+    def test_weights_trust_rating(self):
+        main = self.make_cluster(2)
+        UserProfile.objects.create(user=main.child_reports.first().author, trust_rating=10)
+        main.update_aggregation()
+        # 1 per author plus trust_rating / 10, authors without a profile count 1
+        self.assertAlmostEqual(main.weighted_score, 4.0)
@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from targets.caching import get_version
+from targets.models import Target
+
+
+class TargetVersionTest(TestCase):
+    """Target saves bump the targets version when the public list changes"""
+
+    def setUp(self):
+        self.author = User.objects.create_user('caching-author')
+
+    def save(self, target, **kwargs):
+        before = get_version('targets')
+        with self.captureOnCommitCallbacks(execute=True):
+            target.save(**kwargs)
+        return get_version('targets') != before
+
+    def test_pending_reports_do_not_bump(self):
+        target = Target(title='DRONE', latitude=52.0, longitude=21.0,
+                        target_type='drone', author=self.author)
+        self.assertFalse(self.save(target))
+        target.title = 'DRONE 2'
+        self.assertFalse(self.save(target))
+
+    def test_leaving_the_list_bumps(self):
+        target = Target(title='DRONE', latitude=52.0, longitude=21.0,
+                        target_type='drone', status='unconfirmed', author=self.author)
+        self.assertTrue(self.save(target))
+
+        target = Target.objects.get(pk=target.pk)
+        target.status = 'pending'
+        self.assertTrue(self.save(target, update_fields=['status']))
+        # Back to an ordinary pending report
+        target.title = 'DRONE 2'
+        self.assertFalse(self.save(target))
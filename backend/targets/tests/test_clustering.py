@@ -0,0 +1,19 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from targets.models import Target
+
+
+class IndexedClusteringTest(TestCase):
+    """The indexed clustering decides like the full scan it replaces"""
+
+    def test_matches_full_scan(self):
+        out = StringIO()
+        # Raises CommandError if any decision diverges
+        call_command('check_clustering', reports=300, authors=40, hotspots=8,
+                     stdout=out, stderr=StringIO())
+        self.assertIn('0 mismatches', out.getvalue())
+        # The replay is rolled back
+        self.assertFalse(Target.objects.exists())
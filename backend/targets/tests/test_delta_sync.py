@@ -0,0 +1,36 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from targets.models import Target
+from targets.views import encode_cursor
+
+
+class DeltaSyncTest(TestCase):
+    """?since= lists the targets that changed and the ids that left the map"""
+
+    def setUp(self):
+        self.target = Target.objects.create(
+            title='DRONE', latitude=52.0, longitude=21.0, target_type='drone',
+            status='unconfirmed', author=User.objects.create_user('delta-author'),
+        )
+        self.cursor = encode_cursor(timezone.now())
+
+    def changes(self):
+        response = self.client.get('/api/targets/', {'since': self.cursor})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_changed(self):
+        self.target.title = 'DRONE 2'
+        self.target.save()
+        changes = self.changes()
+        self.assertEqual([target['id'] for target in changes['changed']], [self.target.pk])
+        self.assertEqual(changes['removed'], [])
+
+    def test_moved_back_to_pending(self):
+        self.target.status = 'pending'
+        self.target.save(update_fields=['status'])
+        changes = self.changes()
+        self.assertEqual(changes['changed'], [])
+        self.assertEqual(changes['removed'], [self.target.pk])
@@ -0,0 +1,61 @@
+import time
+from collections import Counter
+
+from django.test import SimpleTestCase
+
+from targets.dispatch import RateLimiter, TelegramDispatcher
+from targets.telegram_stub import TelegramStubServer
+
+
+class TelegramDispatcherTest(SimpleTestCase):
+    """TelegramDispatcher against the local Telegram stub"""
+
+    def dispatcher(self, stub, **options):
+        return TelegramDispatcher(
+            bot_token='test', api_url=stub.url, per_second=0, chat_interval=0, **options
+        )
+
+    def test_send_many_keeps_input_order(self):
+        messages = [(str(chat_id), f"alert {chat_id}") for chat_id in range(30)]
+        with TelegramStubServer(latency=0.005) as stub:
+            results = self.dispatcher(stub, max_in_flight=8).send_many(messages)
+
+        self.assertEqual([result.chat_id for result in results], [chat_id for chat_id, _ in messages])
+        self.assertTrue(all(result.ok and result.attempts == 1 for result in results))
+        self.assertIsNotNone(results[0].sent_at)
+        self.assertCountEqual(
+            [(message['chat_id'], message['text']) for message in stub.messages], messages
+        )
+
+    def test_retries_after_rate_limit(self):
+        with TelegramStubServer(rate_limit_every=2, retry_after=1) as stub:
+            dispatcher = self.dispatcher(stub)
+            first = dispatcher.send('1', 'first')
+            second = dispatcher.send('2', 'second')
+
+        self.assertTrue(first.ok)
+        self.assertEqual(first.attempts, 1)
+        # The 429 pauses the dispatcher, then the message goes through
+        self.assertTrue(second.ok)
+        self.assertEqual(second.attempts, 2)
+        self.assertEqual(stub.request_count, 3)
+        self.assertEqual([message['chat_id'] for message in stub.messages], ['1', '2'])
+
+    def test_missing_token(self):
+        result = TelegramDispatcher(bot_token='', api_url='http://127.0.0.1:9').send('1', 'alert')
+        self.assertFalse(result.ok)
+        self.assertEqual(result.attempts, 0)
+        self.assertEqual(result.error, 'bot token not configured')
+
+
+class RateLimiterTest(SimpleTestCase):
+    """Shared limiters keep the bot within its rate across processes"""
+
+    def test_shared_budget(self):
+        # Two limiters on one cache stand for two worker processes
+        limiters = [RateLimiter(5, 0, shared=True), RateLimiter(5, 0, shared=True)]
+        per_second = Counter()
+        for i in range(12):
+            limiters[i % 2].acquire(str(i))
+            per_second[int(time.time())] += 1
+        self.assertLessEqual(max(per_second.values()), 5)
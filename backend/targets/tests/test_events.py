@@ -0,0 +1,55 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from targets.models import Target
+
+
+class RecordingBroker:
+    def __init__(self):
+        self.events = []
+
+    def publish(self, event):
+        self.events.append(event)
+
+
+class TargetEventsTest(TestCase):
+    """Saves publish stream events only for targets that are or were on the map"""
+
+    def setUp(self):
+        self.broker = RecordingBroker()
+        patcher = mock.patch('targets.events.get_broker', return_value=self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = User.objects.create_user('events-author')
+
+    def create(self, **fields):
+        return Target.objects.create(
+            title='DRONE', latitude=52.0, longitude=21.0, target_type='drone', author=self.author, **fields
+        )
+
+    def events_of(self, target, change):
+        self.broker.events.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            change(target)
+        return [event['type'] for event in self.broker.events if event['data']['id'] == target.pk]
+
+    def test_report_joining_cluster(self):
+        main = self.create(status='unconfirmed')
+        report = self.create()
+
+        def join(report):
+            report.parent_target = main
+            report.save(update_fields=['parent_target'])
+
+        self.assertEqual(self.events_of(report, join), [])
+
+    def test_listed_target_leaving_the_map(self):
+        target = Target.objects.get(pk=self.create(status='unconfirmed').pk)
+
+        def back_to_pending(target):
+            target.status = 'pending'
+            target.save(update_fields=['status'])
+
+        self.assertEqual(self.events_of(target, back_to_pending), ['resolved'])
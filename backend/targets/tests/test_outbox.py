@@ -0,0 +1,57 @@
+import random
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from targets.dispatch import TelegramDispatcher, set_dispatcher
+from targets.management.commands.bench_alert_pipeline import seed_subscribers
+from targets.coalescing import flush_alerts
+from targets.models import AlertDelivery, NotificationJob, Target
+from targets.notifications import notify_users_about_threat
+from targets.outbox import run_once
+from targets.telegram_stub import TelegramStubServer
+
+CENTER = (52.23, 21.01)
+
+
+@override_settings(ALERT_COALESCE_SECONDS=0)
+class ThreatJobTest(TestCase):
+    """Threats alert subscribers only while their target is a threat"""
+
+    def setUp(self):
+        seed_subscribers(random.Random(0), [CENTER], 20)
+        self.stub = TelegramStubServer().start()
+        self.addCleanup(self.stub.stop)
+        previous = set_dispatcher(TelegramDispatcher(
+            bot_token='test', api_url=self.stub.url, per_second=0, chat_interval=0,
+        ))
+        self.addCleanup(set_dispatcher, previous)
+        self.target = Target.objects.create(
+            title='DRONE', latitude=CENTER[0], longitude=CENTER[1], target_type='drone',
+            status='unconfirmed', author=User.objects.create_user('outbox-author'),
+        )
+
+    def threat_alerts(self):
+        return [message for message in self.stub.messages if 'ZAGROŻENIE' in message['text']]
+
+    def test_alerts_active_threat(self):
+        run_once()
+        self.assertTrue(self.threat_alerts())
+
+    def test_rejected_before_delivery(self):
+        self.target.reject()
+        run_once()
+
+        self.assertEqual(self.threat_alerts(), [])
+        job = NotificationJob.objects.get(kind='threat', target=self.target)
+        self.assertEqual(job.status, 'done')
+
+    def test_rejected_while_buffered(self):
+        queued = notify_users_about_threat(self.target)
+        self.target.reject()
+        flush_alerts()
+
+        self.assertEqual(self.threat_alerts(), [])
+        self.assertEqual(
+            AlertDelivery.objects.filter(target=self.target, status='failed').count(), queued
+        )
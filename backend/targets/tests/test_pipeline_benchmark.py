@@ -0,0 +1,124 @@
+"""
+Benchmarks of the alerting pipeline stages against a local Telegram stub.
+They run once as plain tests; measure with `pytest --benchmark-enable
+targets/tests/test_pipeline_benchmark.py`. For p50/p99 latencies of a
+whole report storm see the bench_alert_pipeline command.
+"""
+import random
+from itertools import count
+
+import pytest
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+
+from targets.clustering import MIN_CLUSTER_AUTHORS
+from targets.coalescing import flush_alerts, has_waiting_alerts
+from targets.dispatch import TelegramDispatcher, set_dispatcher
+from targets.management.commands.bench_alert_pipeline import seed_subscribers
+from targets.models import AlertDelivery, Target
+from targets.notifications import notify_users_about_threat
+from targets.telegram_stub import TelegramStubServer
+
+CENTER = (52.23, 21.01)
+SUBSCRIBERS = 200
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def subscribers():
+    return seed_subscribers(random.Random(0), [CENTER], SUBSCRIBERS)
+
+
+@pytest.fixture
+def admin():
+    return User.objects.create_user('bench-admin', is_staff=True)
+
+
+@pytest.fixture
+def stub(settings):
+    settings.ALERT_COALESCE_SECONDS = 0
+    with TelegramStubServer(latency=0.002) as stub:
+        previous = set_dispatcher(TelegramDispatcher(
+            bot_token='bench', api_url=stub.url, per_second=0, chat_interval=0,
+        ))
+        yield stub
+        set_dispatcher(previous)
+
+
+def report(author, offset=0.0, **fields):
+    return Target(
+        title='DRONE',
+        latitude=CENTER[0] + offset,
+        longitude=CENTER[1] + offset,
+        target_type='drone',
+        author=author,
+        **fields,
+    )
+
+
+def test_report_ingestion(benchmark, subscribers):
+    client = APIClient()
+    rng = random.Random(0)
+
+    def post():
+        client.force_authenticate(rng.choice(subscribers))
+        return client.post('/api/targets/', {
+            'title': 'DRONE',
+            'latitude': rng.uniform(49.5, 54.3),
+            'longitude': rng.uniform(14.6, 23.6),
+            'target_type': 'drone',
+        }, format='json')
+
+    response = benchmark(post)
+    assert response.status_code == 201
+
+
+def test_aggregation(benchmark, subscribers):
+    authors = iter(subscribers)
+    # One more report raises a cluster, later ones join it
+    Target.objects.bulk_create([report(next(authors)) for _ in range(MIN_CLUSTER_AUTHORS - 1)])
+
+    def setup():
+        # bulk_create() skips save(), which would aggregate right away
+        [target] = Target.objects.bulk_create([report(next(authors))])
+        target.refresh_from_db()
+        return (target,), {}
+
+    benchmark.pedantic(Target.try_aggregate, setup=setup, rounds=min(50, SUBSCRIBERS))
+    assert Target.objects.filter(status='unconfirmed', parent_target__isnull=True).exists()
+
+
+def test_confirmation(benchmark, subscribers, admin):
+    client = APIClient()
+    client.force_authenticate(admin)
+    clusters = count()
+
+    def setup():
+        # A fresh cluster of MIN_CLUSTER_AUTHORS reports far from the others
+        offset = next(clusters) * 0.1
+        for author in subscribers[:MIN_CLUSTER_AUTHORS]:
+            report(author, offset).save()
+        main = Target.objects.get(status='unconfirmed', parent_target__isnull=True)
+        return (f'/api/targets/{main.pk}/confirm/',), {}
+
+    response = benchmark.pedantic(client.post, setup=setup, rounds=10)
+    assert response.status_code == 200
+
+
+def test_full_fanout(benchmark, subscribers, stub):
+    authors = iter(subscribers)
+
+    def setup():
+        [target] = Target.objects.bulk_create([report(next(authors), status='confirmed')])
+        return (target,), {}
+
+    def fan_out(target):
+        queued = notify_users_about_threat(target)
+        while has_waiting_alerts():
+            flush_alerts()
+        return target, queued
+
+    target, queued = benchmark.pedantic(fan_out, setup=setup, rounds=5)
+    assert queued > 0
+    assert AlertDelivery.objects.filter(target=target, status='sent').count() == queued
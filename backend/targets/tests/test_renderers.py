@@ -0,0 +1,26 @@
+import json
+
+from django.test import TestCase
+
+
+class PackedMapRendererTest(TestCase):
+    """?format=packed answers with binary columns or labelled JSON errors"""
+
+    def test_packed_map(self):
+        response = self.client.get('/api/targets/', {'format': 'packed'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.skyguard.map+octet-stream')
+
+    def test_errors_fall_back_to_json(self):
+        response = self.client.get('/api/targets/', {'format': 'packed', 'bbox': 'nowhere'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('bbox', json.loads(response.content))
+
+    def test_clusters_fall_back_to_json(self):
+        for _ in range(2):
+            # The second response comes from the cache
+            response = self.client.get('/api/targets/', {'format': 'packed', 'zoom': 5})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertIsInstance(json.loads(response.content), list)
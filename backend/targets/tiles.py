@@ -0,0 +1,118 @@
+import math
+
+from django.db.models import Avg, Count, F
+from django.db.models.functions import Floor
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+# At this zoom level and below, points are merged into grid clusters
+CLUSTER_MAX_ZOOM = 10
+# Grid cells per tile edge used for clustering
+CLUSTER_CELLS_PER_TILE = 8
+MAX_ZOOM = 22
+
+
+def parse_bbox(value: str):
+    """Parse "minLon,minLat,maxLon,maxLat" into a tuple of floats"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValidationError({'bbox': 'Expected minLon,minLat,maxLon,maxLat'})
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValidationError({'bbox': 'Minimum must not exceed maximum'})
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def parse_zoom(value) -> int:
+    try:
+        zoom = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({'zoom': 'Expected an integer'})
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise ValidationError({'zoom': f'Must be between 0 and {MAX_ZOOM}'})
+    return zoom
+
+
+def tile_bbox(zoom: int, x: int, y: int):
+    """Bounding box (minLon, minLat, maxLon, maxLat) of a Web Mercator tile"""
+    n = 2 ** zoom
+    if not (0 <= x < n and 0 <= y < n):
+        raise ValidationError({'tile': f'x and y must be between 0 and {n - 1} at zoom {zoom}'})
+
+    def latitude(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360 - 180, latitude(y + 1), (x + 1) / n * 360 - 180, latitude(y)
+
+
+def filter_bbox(queryset, bbox):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return queryset.filter(
+        latitude__gte=min_lat, latitude__lte=max_lat,
+        longitude__gte=min_lon, longitude__lte=max_lon,
+    )
+
+
+def cluster_points(queryset, zoom: int, group_by=(), aggregates=None) -> list:
+    """
+    Merge points into grid cells sized for the zoom level, in the database.
+    Each cluster has its mean position, point count, the group_by fields
+    and any extra aggregates.
+    """
+    cell = 360 / 2 ** zoom / CLUSTER_CELLS_PER_TILE
+    clusters = (
+        queryset.order_by()
+        .annotate(cell_row=Floor(F('latitude') / cell), cell_col=Floor(F('longitude') / cell))
+        .values('cell_row', 'cell_col', *group_by)
+        .annotate(
+            count=Count('pk'),
+            cluster_latitude=Avg('latitude'),
+            cluster_longitude=Avg('longitude'),
+            **(aggregates or {}),
+        )
+    )
+    result = []
+    for cluster in clusters:
+        cluster.pop('cell_row')
+        cluster.pop('cell_col')
+        cluster['latitude'] = cluster.pop('cluster_latitude')
+        cluster['longitude'] = cluster.pop('cluster_longitude')
+        result.append(cluster)
+    return result
+
+
+class ViewportMixin:
+    """
+    Adds ?bbox=minLon,minLat,maxLon,maxLat&zoom=z to list views, and
+    z/x/y tile URLs when the view is routed with those kwargs. At
+    CLUSTER_MAX_ZOOM and below the response is a list of grid clusters
+    instead of individual points.
+    """
+    cluster_group_by = ()
+    cluster_aggregates = None
+
+    def get_bbox(self):
+        if 'z' in self.kwargs:
+            return tile_bbox(int(self.kwargs['z']), int(self.kwargs['x']), int(self.kwargs['y']))
+        bbox = self.request.query_params.get('bbox')
+        return parse_bbox(bbox) if bbox else None
+
+    def get_zoom(self):
+        if 'z' in self.kwargs:
+            return parse_zoom(self.kwargs['z'])
+        zoom = self.request.query_params.get('zoom')
+        return parse_zoom(zoom) if zoom is not None else None
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        bbox = self.get_bbox()
+        if bbox is not None:
+            queryset = filter_bbox(queryset, bbox)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        zoom = self.get_zoom()
+        if zoom is not None and zoom <= CLUSTER_MAX_ZOOM:
+            queryset = self.filter_queryset(self.get_queryset())
+            return Response(cluster_points(queryset, zoom, self.cluster_group_by, self.cluster_aggregates))
+        return super().list(request, *args, **kwargs)
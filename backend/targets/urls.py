@@ -1,14 +1,22 @@
 from django.urls import path
 from .views import (
     TargetListCreateView,
+    TargetStreamView,
+    TargetTileView,
     ShelterListView,
+    ShelterTileView,
+    NearestShelterView,
     ConfirmTargetView,
     RejectTargetView,
 )
 
 urlpatterns = [
     path('targets/', TargetListCreateView.as_view(), name='target-list-create'),
+    path('targets/stream/', TargetStreamView.as_view(), name='target-stream'),
+    path('targets/tiles/<int:z>/<int:x>/<int:y>/', TargetTileView.as_view(), name='target-tile'),
     path('targets/<int:pk>/confirm/', ConfirmTargetView.as_view(), name='target-confirm'),
     path('targets/<int:pk>/reject/', RejectTargetView.as_view(), name='target-reject'),
     path('shelters/', ShelterListView.as_view(), name='shelter-list'),
+    path('shelters/nearest/', NearestShelterView.as_view(), name='shelter-nearest'),
+    path('shelters/tiles/<int:z>/<int:x>/<int:y>/', ShelterTileView.as_view(), name='shelter-tile'),
 ]
\ No newline at end of file
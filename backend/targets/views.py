@@ -1,13 +1,59 @@
+import asyncio
+import json
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views import View
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.throttling import ScopedRateThrottle
 from rest_framework.views import APIView
-from .models import Target, Shelter
+from .caching import VersionedCacheMixin
+from .events import get_broker
+from .models import AlertDelivery, Target, TargetTombstone, Shelter
+from .renderers import MapFormatMixin, PackedMapRenderer, map_columns
 from .serializers import TargetSerializer, ShelterSerializer
-from .notifications import notify_users_about_threat
+from .shelters import shelter_index
+from .tiles import ViewportMixin
+
+
+# Returned cursors lag behind the request time so that changes committed
+# by transactions still running during a poll are picked up by the next one
+SINCE_OVERLAP = timedelta(seconds=5)
+
+
+def encode_cursor(moment) -> str:
+    return str(int(moment.timestamp() * 1_000_000))
+
 
+def decode_cursor(cursor: str):
+    return datetime.fromtimestamp(int(cursor) / 1_000_000, tz=dt_timezone.utc)
 
-class TargetListCreateView(generics.ListCreateAPIView):
+
+def active_targets():
+    """Main targets currently shown on the map"""
+    return Target.objects.filter(
+        status__in=['confirmed', 'unconfirmed'],
+        parent_target__isnull=True
+    )
+
+
+class TargetListCreateView(VersionedCacheMixin, ViewportMixin, MapFormatMixin, generics.ListCreateAPIView):
     serializer_class = TargetSerializer
+    cache_scope = 'targets'
+    cluster_group_by = ('target_type',)
+
+    def get_authenticators(self):
+        # The public list is the same for everyone; skip token lookups
+        if self.request.method == 'GET':
+            return []
+        return super().get_authenticators()
 
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -15,10 +61,7 @@ class TargetListCreateView(generics.ListCreateAPIView):
         return [permissions.AllowAny()]
 
     def get_queryset(self):
-        queryset = Target.objects.filter(
-            status__in=['confirmed', 'unconfirmed'],
-            parent_target__isnull=True
-        )
+        queryset = active_targets().select_related('author')
         
         target_status = self.request.query_params.get('status')
         if target_status in ['unconfirmed', 'confirmed']:
@@ -34,6 +77,70 @@ class TargetListCreateView(generics.ListCreateAPIView):
         
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        cursor = request.query_params.get('since')
+        if cursor is None:
+            return super().list(request, *args, **kwargs)
+        return self.list_changes(cursor)
+
+    def list_changes(self, cursor):
+        """
+        Delta sync: targets created or changed since the cursor, ids of
+        targets that left the map (resolved, filtered out or deleted) and
+        the cursor for the next call. Start with ?since=0; a cursor older
+        than the tombstone retention returns the full list with reset=true.
+        """
+        if self.request.accepted_renderer.format == PackedMapRenderer.format:
+            return Response(
+                {'error': 'The packed format does not support ?since='},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            since = decode_cursor(cursor)
+        except (ValueError, OverflowError, OSError):
+            return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
+        now = timezone.now()
+        next_cursor = encode_cursor(now - SINCE_OVERLAP)
+
+        if since < now - TargetTombstone.RETENTION:
+            return Response({
+                'cursor': next_cursor,
+                'reset': True,
+                'changed': self.serialize_targets(self.filter_queryset(self.get_queryset())),
+                'removed': [],
+            })
+
+        changed = self.serialize_targets(
+            self.filter_queryset(self.get_queryset()).filter(updated_at__gt=since)
+        )
+        changed_ids = set(changed['id'] if self.uses_map_format() else (t['id'] for t in changed))
+
+        # Cluster members never appear on the map; any other target that
+        # changed but no longer matches is removed, including a listed
+        # target moved back to pending
+        touched = Target.objects.filter(
+            updated_at__gt=since,
+            parent_target__isnull=True
+        ).values_list('pk', flat=True)
+        removed = [pk for pk in touched if pk not in changed_ids]
+        removed += TargetTombstone.objects.filter(
+            deleted_at__gt=since
+        ).values_list('target_id', flat=True)
+
+        return Response({
+            'cursor': next_cursor,
+            'reset': False,
+            'changed': changed,
+            'removed': removed,
+        })
+
+    def serialize_targets(self, queryset):
+        if self.uses_map_format():
+            return map_columns(queryset)
+        return self.get_serializer(queryset, many=True).data
+
     def perform_create(self, serializer):
         target_type = serializer.validated_data.get('target_type', 'drone')
         serializer.save(
@@ -43,6 +150,51 @@ class TargetListCreateView(generics.ListCreateAPIView):
         )
 
 
+class TargetStreamView(View):
+    """
+    Server-Sent Events feed of map targets: a "snapshot" event with the
+    active list, followed by "created", "updated" and "resolved" events.
+    Streams need an ASGI server (e.g. uvicorn backend.asgi:application);
+    under WSGI, which buffers the whole response, the stream is refused
+    with 503 and clients poll the list instead.
+    """
+    keepalive_seconds = 15
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return HttpResponse("Streaming needs an ASGI server", status=503, content_type='text/plain')
+        response = StreamingHttpResponse(self.stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @staticmethod
+    def event(name, data) -> str:
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+    @staticmethod
+    def snapshot():
+        return TargetSerializer(active_targets().select_related('author'), many=True).data
+
+    async def stream(self):
+        # Subscribe before reading the snapshot so no change falls in between
+        subscription = get_broker().subscribe()
+        try:
+            yield self.event('snapshot', await sync_to_async(self.snapshot)())
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), self.keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event['type'] == 'reset':
+                    yield self.event('snapshot', await sync_to_async(self.snapshot)())
+                else:
+                    yield self.event(event['type'], event['data'])
+        finally:
+            subscription.close()
+
+
 class PendingTargetListView(generics.ListAPIView):
     serializer_class = TargetSerializer
     permission_classes = [permissions.IsAdminUser]
@@ -60,20 +212,78 @@ class VerifyTargetView(APIView):
             target.status = 'confirmed'
             target.save()
             
-            notified_count = notify_users_about_threat(target)
-            
+            # Alerts go out through the outbox worker, so the count kept
+            # for existing clients only covers those delivered so far
             return Response({
                 'status': 'Target verified successfully',
-                'notifications_sent': notified_count
+                'notifications_sent': AlertDelivery.objects.filter(target=target, status='sent').count(),
+                'notifications_queued': target.notifications_sent
             }, status=status.HTTP_200_OK)
         except Target.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
 
-class ShelterListView(generics.ListAPIView):
+class TargetTileView(TargetListCreateView):
+    """Map targets inside one z/x/y tile, cached per tile and data version"""
+    http_method_names = ['get', 'head', 'options']
+
+    def get_permissions(self):
+        return [permissions.AllowAny()]
+
+
+class ShelterListView(VersionedCacheMixin, ViewportMixin, generics.ListAPIView):
     queryset = Shelter.objects.all()
     serializer_class = ShelterSerializer
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    cache_scope = 'shelters'
+    cluster_aggregates = {'capacity': Sum('capacity')}
+
+
+class ShelterTileView(ShelterListView):
+    """Shelters inside one z/x/y tile, cached per tile and data version"""
+
+
+def query_number(params, name: str, cast, minimum, maximum, default=None):
+    value = params.get(name)
+    if value is None:
+        if default is None:
+            raise ValidationError({name: 'This parameter is required'})
+        return default
+    try:
+        value = cast(value)
+    except ValueError:
+        raise ValidationError({name: f'Expected {"an integer" if cast is int else "a number"}'})
+    if not minimum <= value <= maximum:
+        raise ValidationError({name: f'Must be between {minimum} and {maximum}'})
+    return value
+
+
+class NearestShelterView(APIView):
+    """
+    k shelters nearest to ?lat=&lon=, optionally with at least
+    ?min_capacity= places, nearest first with their distance in km.
+    """
+    authentication_classes = []
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'shelters_nearest'
+    max_results = 50
+
+    def get(self, request):
+        params = request.query_params
+        latitude = query_number(params, 'lat', float, -90, 90)
+        longitude = query_number(params, 'lon', float, -180, 180)
+        k = query_number(params, 'k', int, 1, self.max_results, default=1)
+        min_capacity = query_number(params, 'min_capacity', int, 0, 10 ** 9, default=0)
+
+        nearest = shelter_index.nearest(latitude, longitude, k, min_capacity)
+        shelters = Shelter.objects.in_bulk([pk for pk, _ in nearest])
+        results = []
+        for pk, distance in nearest:
+            if pk in shelters:
+                results.append({**ShelterSerializer(shelters[pk]).data, 'distance_km': round(distance, 3)})
+        return Response(results)
 
 
 class ConfirmTargetView(APIView):
@@ -1,6 +1,9 @@
+import asyncio
+import logging
 import os
 import sys
-import time
+from collections import defaultdict
+
 import requests
 import django
 
@@ -14,154 +17,82 @@ load_dotenv(BASE_DIR / '.env')
 
 django.setup()
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from users.models import UserProfile, TelegramLinkCode
-from users.telegram_utils import get_user_by_code
+from django.db import close_old_connections
+from users.telegram_handlers import handle_update, update_chat_id
+
+logger = logging.getLogger('telegram_bot')
 
 BOT_TOKEN = getattr(settings, 'TELEGRAM_BOT_TOKEN', None) or os.getenv('TELEGRAM_BOT_TOKEN')
-API_URL = f"https://api.telegram.org/bot{BOT_TOKEN}"
+API_URL = f"{getattr(settings, 'TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/')}/bot{BOT_TOKEN}"
+
+# Updates handled at the same time within one getUpdates batch
+MAX_CONCURRENT_UPDATES = int(os.getenv('TELEGRAM_BOT_CONCURRENCY', '16'))
+POLL_TIMEOUT = 30
 
 
-def send_message(chat_id: str, text: str):
-    url = f"{API_URL}/sendMessage"
-    payload = {
-        'chat_id': chat_id,
-        'text': text,
-        'parse_mode': 'HTML'
-    }
+def run_handler(update: dict):
     try:
-        requests.post(url, json=payload, timeout=10)
-    except Exception as e:
-        print(f"Error sending message: {e}")
-
-
-def handle_message(message: dict):
-    chat_id = str(message['chat']['id'])
-    text = message.get('text', '')
-    username = message['from'].get('username', 'User')
-    
-    print(f"Message from {username} ({chat_id}): {text}")
-    print(f"  Raw text bytes: {text.encode()}")
-    
-    if text.startswith('/start '):
-        code = text.split(' ', 1)[1].strip().upper()
-        print(f"  Extracted code: '{code}'")
-        
-        from users.models import TelegramLinkCode
-        all_codes = TelegramLinkCode.objects.filter(used=False)
-        print(f"  Available codes in DB: {[c.code for c in all_codes]}")
-        
-        user, link = get_user_by_code(code)
-        print(f"  Lookup result: user={user}, link={link}")
-        
-        if user and link:
-            if not hasattr(user, 'profile'):
-                UserProfile.objects.create(user=user)
-            
-            profile = user.profile
-            profile.telegram_chat_id = chat_id
-            profile.notifications_enabled = True
-            profile.save()
-            
-            link.mark_used()
-            
-            send_message(
-                chat_id,
-                f"✅ <b>Połączono pomyślnie!</b>\n\n"
-                f"Twoje konto <b>{user.username}</b> zostało połączone z tym czatem.\n\n"
-                f"Teraz będziesz otrzymywać powiadomienia o zagrożeniach w promieniu 30 km od Twojej lokalizacji.\n\n"
-                f"🔔 Upewnij się, że zaktualizowałeś swoją lokalizację w aplikacji!"
-            )
-            print(f"Linked user {user.username} to chat {chat_id}")
-            return
-        
-        send_message(
-            chat_id,
-            "❌ <b>Nieprawidłowy lub wygasły kod.</b>\n\n"
-            "Wygeneruj nowy kod w aplikacji i spróbuj ponownie."
-        )
-    
-    elif text == '/start':
-        send_message(
-            chat_id,
-            "👋 <b>Witaj w SkyGuard Bot!</b>\n\n"
-            "Aby połączyć swoje konto:\n"
-            "1. Otwórz aplikację SkyGuard\n"
-            "2. Przejdź do zakładki Profile\n"
-            "3. Kliknij 'Connect Telegram'\n"
-            "4. Kliknij wygenerowany link\n\n"
-            "Po połączeniu będziesz otrzymywać powiadomienia o zagrożeniach! 🚨"
-        )
-    
-    elif text == '/status':
-        try:
-            profile = UserProfile.objects.get(telegram_chat_id=chat_id)
-            user = profile.user
-            location = "nie ustawiona"
-            if profile.last_latitude and profile.last_longitude:
-                location = f"{profile.last_latitude:.4f}, {profile.last_longitude:.4f}"
-            
-            send_message(
-                chat_id,
-                f"📊 <b>Status konta</b>\n\n"
-                f"👤 Użytkownik: <b>{user.username}</b>\n"
-                f"📍 Lokalizacja: {location}\n"
-                f"🔔 Powiadomienia: {'✅ włączone' if profile.notifications_enabled else '❌ wyłączone'}"
-            )
-        except UserProfile.DoesNotExist:
-            send_message(
-                chat_id,
-                "❌ Ten czat nie jest połączony z żadnym kontem.\n\n"
-                "Użyj aplikacji SkyGuard, aby połączyć konto."
-            )
-    
-    elif text == '/help':
-        send_message(
-            chat_id,
-            "📖 <b>Dostępne komendy:</b>\n\n"
-            "/start - Rozpocznij i połącz konto\n"
-            "/status - Sprawdź status konta\n"
-            "/help - Pokaż tę wiadomość\n\n"
-            "🚨 Powiadomienia o zagrożeniach są wysyłane automatycznie!"
-        )
-
-
-def poll_updates():
-    print("SkyGuard Telegram Bot started!")
-    print("Listening for messages... (Press Ctrl+C to stop)\n")
-    
+        handle_update(update)
+    finally:
+        close_old_connections()
+
+
+async def handle_chat(updates: list, semaphore: asyncio.Semaphore):
+    """Handle one chat's updates in order; different chats run concurrently"""
+    for update in updates:
+        async with semaphore:
+            try:
+                await sync_to_async(run_handler, thread_sensitive=False)(update)
+            except Exception:
+                logger.exception("Error handling update", extra={'update_id': update.get('update_id')})
+
+
+async def handle_batch(updates: list, semaphore: asyncio.Semaphore):
+    by_chat = defaultdict(list)
+    for update in sorted(updates, key=lambda update: update['update_id']):
+        by_chat[update_chat_id(update)].append(update)
+    await asyncio.gather(*(handle_chat(chat_updates, semaphore) for chat_updates in by_chat.values()))
+
+
+async def poll_updates():
+    logger.info("SkyGuard Telegram Bot started, listening for messages (Ctrl+C to stop)")
+
+    session = requests.Session()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPDATES)
     offset = 0
-    
+
     while True:
         try:
-            url = f"{API_URL}/getUpdates"
-            params = {
-                'offset': offset,
-                'timeout': 30
-            }
-            
-            response = requests.get(url, params=params, timeout=35)
+            response = await asyncio.to_thread(
+                session.get,
+                f"{API_URL}/getUpdates",
+                params={'offset': offset, 'timeout': POLL_TIMEOUT},
+                timeout=POLL_TIMEOUT + 5,
+            )
             data = response.json()
-            
-            if data.get('ok') and data.get('result'):
-                for update in data['result']:
-                    offset = update['update_id'] + 1
-                    
-                    if 'message' in update:
-                        handle_message(update['message'])
-        
-        except KeyboardInterrupt:
-            print("\nBot stopped.")
-            break
-        except Exception as e:
-            print(f"Error: {e}")
-            time.sleep(5)
+        except Exception:
+            logger.exception("getUpdates failed, retrying in 5 s")
+            await asyncio.sleep(5)
+            continue
+
+        updates = data.get('result') if data.get('ok') else None
+        if not updates:
+            continue
+
+        await handle_batch(updates, semaphore)
+        # Telegram drops everything below the offset on the next call, so
+        # it only moves past the batch once every update was handled
+        offset = max(update['update_id'] for update in updates) + 1
 
 
 if __name__ == '__main__':
     if not BOT_TOKEN:
-        print("Error: TELEGRAM_BOT_TOKEN not set in environment")
-        print("Make sure to load .env file or set the variable")
+        logger.error("TELEGRAM_BOT_TOKEN not set in environment; load the .env file or set the variable")
         sys.exit(1)
-    
-    poll_updates()
+
+    try:
+        asyncio.run(poll_updates())
+    except KeyboardInterrupt:
+        logger.info("Bot stopped")
@@ -0,0 +1,195 @@
+"""
+Write-coalescing buffer for subscriber locations.
+
+Clients post their location every few seconds. record_location() drops
+moves shorter than LOCATION_MIN_MOVE_METERS and keeps the newest
+position in the cache instead of saving the profile. flush_locations()
+writes the buffered positions with bulk_update, at most every
+LOCATION_FLUSH_SECONDS and before every threat fan-out, so alerts use
+the newest positions.
+
+Every buffered position is also appended to a journal of numbered cache
+entries, which tells any process what to flush without scanning the
+cache.
+
+The buffer only works with a cache shared by all processes (Redis).
+With a per-process cache such as the local-memory default, the worker
+could never see positions posted to the web process, so every new
+position is written straight through instead. Moves that change the
+subscriber's regions are always written through, so the memberships and
+the position alerts measure distances from agree.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from targets.caching import is_shared_cache
+from targets.geo import grid_cells_in_radius, haversine
+from targets.regions import ALERT_RADIUS_KM, assign_regions
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'location:pending:{}'
+JOURNAL_KEY = 'location:journal:{}'
+HEAD_KEY = 'location:journal:head'
+TAIL_KEY = 'location:journal:tail'
+SEEN_KEY = 'location:journal:seen'
+FLUSH_LOCK_KEY = 'location:flush-lock'
+FLUSH_DUE_KEY = 'location:flush-due'
+
+# Positions and journal entries stay buffered for many flush intervals
+BUFFER_TIMEOUT = 24 * 3600
+# Written positions expire after this many flush intervals, so they stop
+# shadowing the profile, e.g. after an admin edit
+FLUSHED_INTERVALS = 3
+FLUSH_LOCK_TIMEOUT = 60
+FLUSH_BATCH_SIZE = 1000
+LOCATION_FIELDS = ['last_latitude', 'last_longitude']
+
+
+def is_buffered() -> bool:
+    """Whether positions are buffered, i.e. the default cache is shared"""
+    return is_shared_cache()
+
+
+def current_location(profile):
+    """Newest known (latitude, longitude) of a profile, buffered or saved"""
+    pending = cache.get(PENDING_KEY.format(profile.pk))
+    if pending is not None:
+        return pending
+    return profile.last_latitude, profile.last_longitude
+
+
+def apply_pending_location(profile):
+    """Show the buffered position, if any, on a loaded profile"""
+    apply_pending_locations([profile])
+    return profile
+
+
+def apply_pending_locations(profiles):
+    """Show the buffered positions, if any, on loaded profiles"""
+    keys = {PENDING_KEY.format(profile.pk): profile for profile in profiles}
+    for key, pending in cache.get_many(keys).items():
+        keys[key].set_location(*pending)
+
+
+def _append_to_journal(profile_id: int):
+    try:
+        number = cache.incr(HEAD_KEY)
+    except ValueError:
+        cache.add(HEAD_KEY, 0, None)
+        number = cache.incr(HEAD_KEY)
+    cache.set(JOURNAL_KEY.format(number), profile_id, BUFFER_TIMEOUT)
+
+
+def record_location(profile, latitude: float, longitude: float) -> bool:
+    """
+    Buffer a new position of the profile and set it on the instance.
+    Returns False, leaving the newest known position on the instance,
+    when it moved less than LOCATION_MIN_MOVE_METERS.
+    """
+    previous_latitude, previous_longitude = current_location(profile)
+    has_previous = previous_latitude is not None and previous_longitude is not None
+    if has_previous:
+        moved_km = haversine(previous_latitude, previous_longitude, latitude, longitude)
+        if moved_km * 1000 < getattr(settings, 'LOCATION_MIN_MOVE_METERS', 50):
+            profile.set_location(previous_latitude, previous_longitude)
+            return False
+
+    profile.set_location(latitude, longitude)
+    # Memberships only change when the alert circle reaches other regions
+    regions_changed = not has_previous or set(grid_cells_in_radius(previous_latitude, previous_longitude, ALERT_RADIUS_KM)) \
+        != set(grid_cells_in_radius(latitude, longitude, ALERT_RADIUS_KM))
+
+    if regions_changed or not is_buffered():
+        # Dropped first, so a flush cannot overwrite this with an older position
+        cache.delete(PENDING_KEY.format(profile.pk))
+        profile.save(update_fields=LOCATION_FIELDS)
+        if regions_changed:
+            assign_regions(profile)
+        return True
+
+    # The position is buffered before it is journaled, so a flush that
+    # reads the journal entry always finds this position or a newer one
+    cache.set(PENDING_KEY.format(profile.pk), (latitude, longitude), BUFFER_TIMEOUT)
+    _append_to_journal(profile.pk)
+    flush_if_due()
+    return True
+
+
+def _write_pending(profile_ids) -> int:
+    from .models import UserProfile
+
+    keys = {PENDING_KEY.format(profile_id): profile_id for profile_id in profile_ids}
+    pending = cache.get_many(keys)
+    profiles = []
+    for key, (latitude, longitude) in pending.items():
+        profile = UserProfile(pk=keys[key])
+        profile.set_location(latitude, longitude)
+        profiles.append(profile)
+    # Profiles deleted in the meantime simply match no row
+    UserProfile.objects.bulk_update(profiles, LOCATION_FIELDS, batch_size=FLUSH_BATCH_SIZE)
+    # Positions that moved on meanwhile keep the full timeout. touch() never
+    # changes a value, so one moved on after this check is journaled and
+    # written by the next flush before it expires.
+    timeout = FLUSHED_INTERVALS * getattr(settings, 'LOCATION_FLUSH_SECONDS', 10)
+    for key, position in cache.get_many(list(pending)).items():
+        if position == pending[key]:
+            cache.touch(key, timeout)
+    return len(profiles)
+
+
+def flush_locations() -> int:
+    """
+    Write the buffered positions journaled since the last flush.
+    Returns the number of profiles updated; 0 when another process is
+    flushing already.
+    """
+    if not cache.add(FLUSH_LOCK_KEY, 1, FLUSH_LOCK_TIMEOUT):
+        return 0
+    try:
+        head = cache.get(HEAD_KEY) or 0
+        tail = cache.get(TAIL_KEY) or 0
+        # Entries up to the head seen by the previous flush had a whole
+        # interval to be stored; if they are still missing they were
+        # evicted. Newer ones may belong to a writer between incr() and
+        # set(), so the flush stops before them and retries next time.
+        seen = cache.get(SEEN_KEY) or 0
+        if head < tail:
+            # The counter was lost with the cache and started over
+            tail = seen = 0
+        cache.set(SEEN_KEY, head, None)
+
+        written = 0
+        while tail < head:
+            numbers = range(tail + 1, min(head, tail + FLUSH_BATCH_SIZE) + 1)
+            entries = cache.get_many([JOURNAL_KEY.format(number) for number in numbers])
+            profile_ids = set()
+            last = numbers[-1]
+            for number in numbers:
+                profile_id = entries.get(JOURNAL_KEY.format(number))
+                if profile_id is not None:
+                    profile_ids.add(profile_id)
+                elif number > seen:
+                    last = number - 1
+                    break
+
+            written += _write_pending(profile_ids)
+            cache.delete_many([JOURNAL_KEY.format(number) for number in range(tail + 1, last + 1)])
+            cache.set(TAIL_KEY, last, None)
+            if last < numbers[-1]:
+                break
+            tail = last
+        if written:
+            logger.debug("Flushed buffered locations", extra={'profiles': written})
+        return written
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+
+def flush_if_due() -> int:
+    """flush_locations() if none ran in the last LOCATION_FLUSH_SECONDS"""
+    if cache.add(FLUSH_DUE_KEY, 1, getattr(settings, 'LOCATION_FLUSH_SECONDS', 10)):
+        return flush_locations()
+    return 0
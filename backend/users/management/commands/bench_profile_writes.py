@@ -0,0 +1,115 @@
+import re
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from users import models as user_models
+from users.models import UserProfile
+
+USERNAME_PREFIX = 'bench-profile'
+PASSWORD = 'bench-password-123'
+
+WRITE = re.compile(r'^(INSERT INTO|UPDATE|DELETE FROM) "(\w+)"')
+
+
+class Command(BaseCommand):
+    help = (
+        "Count the database writes of registration, login and profile edits. "
+        "--full-saves shows the previous behaviour, where every User save also "
+        "wrote the whole profile row. All writes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help="Times each flow is run")
+        parser.add_argument('--full-saves', action='store_true', help="Disable profile dirty tracking")
+
+    def handle(self, *args, **options):
+        # Fast hashing keeps the run about the writes
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']), \
+                self.profile_saves(options['full_saves']):
+            with transaction.atomic():
+                self.run(options['users'])
+                transaction.set_rollback(True)
+
+    @contextmanager
+    def profile_saves(self, full):
+        if not full:
+            yield
+            return
+
+        def save_whole_profile(sender, instance, **kwargs):
+            if hasattr(instance, 'profile'):
+                instance.profile.save()
+
+        original_changed_fields = UserProfile.changed_fields
+        UserProfile.changed_fields = lambda profile: list(profile._tracked_values())
+        post_save.disconnect(user_models.save_user_profile, sender=User)
+        post_save.connect(save_whole_profile, sender=User)
+        try:
+            yield
+        finally:
+            post_save.disconnect(save_whole_profile, sender=User)
+            post_save.connect(user_models.save_user_profile, sender=User)
+            UserProfile.changed_fields = original_changed_fields
+
+    def run(self, count):
+        api = APIClient()
+        session = Client()
+        # A fresh prefix per run never collides with existing users
+        prefix = f"{USERNAME_PREFIX}-{uuid.uuid4().hex[:8]}"
+        usernames = [f"{prefix}-{i}" for i in range(count)]
+
+        def register(username):
+            api.post('/api/register/', {'username': username, 'email': f"{username}@example.com", 'password': PASSWORD})
+
+        def jwt_login(username):
+            api.post('/api/login/', {'username': username, 'password': PASSWORD})
+
+        def session_login(username):
+            # Saves last_login, like admin logins
+            session.login(username=username, password=PASSWORD)
+
+        def edit_profile(username):
+            api.force_authenticate(User.objects.get(username=username))
+            api.patch('/api/me/', {'first_name': 'Bench', 'bio': f"Bio of {username}"}, format='json')
+            api.force_authenticate(None)
+
+        def toggle_telegram(username):
+            api.force_authenticate(User.objects.get(username=username))
+            api.post('/api/me/telegram/', {'notifications_enabled': False}, format='json')
+            api.force_authenticate(None)
+
+        flows = [
+            ('registration', register),
+            ('jwt login', jwt_login),
+            ('session login', session_login),
+            ('profile edit', edit_profile),
+            ('notifications', toggle_telegram),
+        ]
+        self.stdout.write(f"{'flow':<14} {'writes/op':>10} {'profile/op':>11}  profile columns written")
+        for name, flow in flows:
+            writes = Counter()
+            columns = Counter()
+            for username in usernames:
+                with CaptureQueriesContext(connection) as queries:
+                    flow(username)
+                for query in queries:
+                    match = WRITE.match(query['sql'])
+                    if not match:
+                        continue
+                    writes[match.group(2)] += 1
+                    if match.group(2) == UserProfile._meta.db_table and match.group(1) == 'UPDATE':
+                        columns.update(re.findall(r'"(\w+)" = ', query['sql'].split(' WHERE ')[0]))
+            profile_writes = writes[UserProfile._meta.db_table]
+            self.stdout.write(
+                f"{name:<14} {sum(writes.values()) / count:>10.2f} {profile_writes / count:>11.2f}  "
+                f"{', '.join(sorted(columns)) or '-'}"
+            )
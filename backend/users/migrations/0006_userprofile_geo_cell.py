@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:45
+
+from django.db import migrations, models
+
+
+def fill_geo_cell(apps, schema_editor):
+    from targets.geo import grid_cell
+
+    UserProfile = apps.get_model('users', 'UserProfile')
+    profiles = UserProfile.objects.filter(
+        last_latitude__isnull=False,
+        last_longitude__isnull=False,
+    )
+    for profile in profiles.iterator():
+        profile.geo_cell = grid_cell(profile.last_latitude, profile.last_longitude)
+        profile.save(update_fields=['geo_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_alter_userprofile_trust_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='geo_cell',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=32),
+        ),
+        migrations.RunPython(fill_geo_cell, migrations.RunPython.noop),
+    ]
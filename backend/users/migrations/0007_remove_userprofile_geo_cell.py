@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:39
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_userprofile_geo_cell'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='geo_cell',
+        ),
+    ]
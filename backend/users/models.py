@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.fields.files import FieldFile
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -23,6 +24,62 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.username} - Rating: {self.trust_rating}"
 
+    # Dirty tracking: a loaded profile remembers the values it was loaded
+    # or last saved with, and save() only writes the fields changed since.
+    # Other code updates columns such as trust_rating with queryset
+    # updates, which a full save of a stale instance would overwrite.
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_values = instance._tracked_values()
+        return instance
+
+    def _tracked_values(self, names=None) -> dict:
+        deferred = self.get_deferred_fields()
+        values = {}
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname in deferred or (names is not None and field.name not in names):
+                continue
+            value = getattr(self, field.attname)
+            if isinstance(value, FieldFile):
+                # A newly assigned file is uncommitted even if the name is reused
+                value = (value.name, value._committed)
+            values[field.name] = value
+        return values
+
+    def changed_fields(self) -> list:
+        """Names of the fields changed since the profile was loaded or saved"""
+        saved = getattr(self, '_saved_values', None)
+        current = self._tracked_values()
+        if saved is None:
+            return list(current)
+        return [name for name, value in current.items() if name not in saved or saved[name] != value]
+
+    def save(self, *args, **kwargs):
+        """
+        Without update_fields, an existing profile writes only its changed
+        fields, and nothing at all when none changed.
+        """
+        if not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert') \
+                and not self._state.adding and getattr(self, '_saved_values', None) is not None:
+            kwargs['update_fields'] = self.changed_fields()
+        super().save(*args, **kwargs)
+        saved = getattr(self, '_saved_values', None) or {}
+        saved.update(self._tracked_values(kwargs.get('update_fields')))
+        self._saved_values = saved
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        saved = getattr(self, '_saved_values', None) or {}
+        saved.update(self._tracked_values(fields))
+        self._saved_values = saved
+
+    def set_location(self, latitude, longitude):
+        """Set last known location"""
+        self.last_latitude = latitude
+        self.last_longitude = longitude
+
     class Meta:
         verbose_name = 'User Profile'
         verbose_name_plural = 'User Profiles'
@@ -49,20 +106,6 @@ class TelegramLinkCode(models.Model):
         expires_at = timezone.now() + timedelta(minutes=10)
         return cls.objects.create(user=user, code=code, expires_at=expires_at)
 
-    @classmethod
-    def get_user_by_code(cls, code):
-        try:
-            link = cls.objects.get(code=code.upper(), used=False)
-            if link.is_valid():
-                return link.user, link
-            return None, None
-        except cls.DoesNotExist:
-            return None, None
-
-    def mark_used(self):
-        self.used = True
-        self.save()
-
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -72,5 +115,8 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
+    # Only a profile already loaded through this user can hold changes;
+    # looking it up would cost a query on every save, e.g. on login
+    profile = User.profile.related.get_cached_value(instance, default=None)
+    if profile is not None:
+        profile.save()
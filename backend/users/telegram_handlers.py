@@ -0,0 +1,129 @@
+"""
+Bot commands, shared by TelegramWebhookView and the polling runner in
+telegram_bot.py. Each update costs at most three queries.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from targets.dispatch import get_dispatcher
+from .locations import apply_pending_location
+
+LINKED_MESSAGE = (
+    "✅ <b>Połączono pomyślnie!</b>\n\n"
+    "Twoje konto <b>{username}</b> zostało połączone z tym czatem.\n\n"
+    "Teraz będziesz otrzymywać powiadomienia o zagrożeniach w promieniu 30 km od Twojej lokalizacji.\n\n"
+    "🔔 Upewnij się, że zaktualizowałeś swoją lokalizację w aplikacji!"
+)
+
+INVALID_CODE_MESSAGE = (
+    "❌ <b>Nieprawidłowy lub wygasły kod.</b>\n\n"
+    "Wygeneruj nowy kod w aplikacji i spróbuj ponownie."
+)
+
+WELCOME_MESSAGE = (
+    "👋 <b>Witaj w SkyGuard Bot!</b>\n\n"
+    "Aby połączyć swoje konto:\n"
+    "1. Otwórz aplikację SkyGuard\n"
+    "2. Przejdź do zakładki Profile\n"
+    "3. Kliknij 'Connect Telegram'\n"
+    "4. Kliknij wygenerowany link lub skopiuj kod\n\n"
+    "Po połączeniu będziesz otrzymywać powiadomienia o zagrożeniach! 🚨"
+)
+
+NOT_LINKED_MESSAGE = (
+    "❌ Ten czat nie jest połączony z żadnym kontem.\n\n"
+    "Użyj aplikacji SkyGuard, aby połączyć konto."
+)
+
+HELP_MESSAGE = (
+    "📖 <b>Dostępne komendy:</b>\n\n"
+    "/start - Rozpocznij i połącz konto\n"
+    "/status - Sprawdź status konta\n"
+    "/help - Pokaż tę wiadomość\n\n"
+    "🚨 Powiadomienia o zagrożeniach są wysyłane automatycznie!"
+)
+
+
+def reply(chat_id: str, text: str) -> bool:
+    return get_dispatcher().send(chat_id, text).ok
+
+
+def update_chat_id(update: dict):
+    """Chat the update belongs to, or None for updates without a message"""
+    message = update.get('message')
+    if not message:
+        return None
+    return str(message['chat']['id'])
+
+
+def handle_update(update: dict) -> str:
+    """
+    Run the command in a Telegram update and reply to the chat.
+    Returns 'linked' when an account was linked, 'ok' otherwise.
+    """
+    message = update.get('message')
+    if not message:
+        return 'ok'
+
+    chat_id = str(message['chat']['id'])
+    text = message.get('text', '').strip()
+
+    if text.startswith('/start '):
+        return link_chat(chat_id, text.split(' ', 1)[1].strip())
+    if text == '/start':
+        reply(chat_id, WELCOME_MESSAGE)
+    elif text == '/status':
+        send_status(chat_id)
+    elif text == '/help':
+        reply(chat_id, HELP_MESSAGE)
+    return 'ok'
+
+
+def link_chat(chat_id: str, code: str) -> str:
+    """Connect the chat to the account that generated the code"""
+    from .models import TelegramLinkCode, UserProfile
+
+    link = (
+        TelegramLinkCode.objects.select_related('user__profile')
+        .filter(code=code.upper(), used=False, expires_at__gt=timezone.now())
+        .first()
+    )
+    if link is None:
+        reply(chat_id, INVALID_CODE_MESSAGE)
+        return 'ok'
+
+    with transaction.atomic():
+        # Only one update may consume the code, even if Telegram
+        # delivers it twice or webhook and polling race
+        if not TelegramLinkCode.objects.filter(pk=link.pk, used=False).update(used=True):
+            reply(chat_id, INVALID_CODE_MESSAGE)
+            return 'ok'
+        updated = UserProfile.objects.filter(user_id=link.user_id).update(
+            telegram_chat_id=chat_id, notifications_enabled=True
+        )
+        if not updated:
+            UserProfile.objects.create(user_id=link.user_id, telegram_chat_id=chat_id)
+
+    reply(chat_id, LINKED_MESSAGE.format(username=link.user.username))
+    return 'linked'
+
+
+def send_status(chat_id: str):
+    from .models import UserProfile
+
+    profile = UserProfile.objects.select_related('user').filter(telegram_chat_id=chat_id).first()
+    if profile is None:
+        reply(chat_id, NOT_LINKED_MESSAGE)
+        return
+
+    apply_pending_location(profile)
+    location = "nie ustawiona"
+    if profile.last_latitude and profile.last_longitude:
+        location = f"{profile.last_latitude:.4f}, {profile.last_longitude:.4f}"
+    reply(
+        chat_id,
+        f"📊 <b>Status konta</b>\n\n"
+        f"👤 Użytkownik: <b>{profile.user.username}</b>\n"
+        f"📍 Lokalizacja: {location}\n"
+        f"🔔 Powiadomienia: {'✅ włączone' if profile.notifications_enabled else '❌ wyłączone'}"
+    )
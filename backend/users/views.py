@@ -3,9 +3,11 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.contrib.auth.models import User
+from .locations import apply_pending_location, record_location
 from .serializers import RegisterSerializer, UserSerializer, UserUpdateSerializer
 from .models import UserProfile
-from .telegram_utils import generate_link_code, get_user_by_code, get_bot_username, send_telegram_message
+from .telegram_handlers import handle_update
+from .telegram_utils import generate_link_code, get_bot_username
 
 
 class RegisterView(generics.CreateAPIView):
@@ -20,6 +22,7 @@ class CurrentUserView(APIView):
     def get(self, request):
         if not hasattr(request.user, 'profile'):
             UserProfile.objects.create(user=request.user)
+        apply_pending_location(request.user.profile)
         serializer = UserSerializer(request.user)
         return Response(serializer.data)
 
@@ -66,7 +69,10 @@ class UserRatingView(APIView):
 
 
 class UpdateLocationView(APIView):
-    """Update user's last known location for threat notifications"""
+    """
+    Update user's last known location for threat notifications.
+    Updates are buffered and written in batches (see locations).
+    """
     permission_classes = (permissions.IsAuthenticated,)
 
     def post(self, request):
@@ -83,13 +89,14 @@ class UpdateLocationView(APIView):
             )
         
         try:
+            latitude, longitude = float(latitude), float(longitude)
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ValueError
             profile = request.user.profile
-            profile.last_latitude = float(latitude)
-            profile.last_longitude = float(longitude)
-            profile.save()
+            moved = record_location(profile, latitude, longitude)
             
             return Response({
-                'status': 'Location updated',
+                'status': 'Location updated' if moved else 'Location unchanged',
                 'latitude': profile.last_latitude,
                 'longitude': profile.last_longitude
             })
@@ -147,55 +154,4 @@ class TelegramWebhookView(APIView):
     permission_classes = (permissions.AllowAny,)
 
     def post(self, request):
-        data = request.data
-        
-        # Handle /start command with link code
-        if 'message' in data:
-            message = data['message']
-            chat_id = str(message['chat']['id'])
-            text = message.get('text', '')
-            
-            if text.startswith('/start '):
-                code = text.split(' ', 1)[1].strip()
-                user, link = get_user_by_code(code)
-                
-                if user and link:
-                    if not hasattr(user, 'profile'):
-                        UserProfile.objects.create(user=user)
-                    
-                    profile = user.profile
-                    profile.telegram_chat_id = chat_id
-                    profile.notifications_enabled = True
-                    profile.save()
-                    
-                    link.mark_used()
-                    
-                    send_telegram_message(
-                        chat_id,
-                        f"✅ <b>Połączono pomyślnie!</b>\n\n"
-                        f"Twoje konto <b>{user.username}</b> zostało połączone z tym czatem.\n\n"
-                        f"Teraz będziesz otrzymywać powiadomienia o zagrożeniach w promieniu 30 km od Twojej lokalizacji.\n\n"
-                        f"🔔 Upewnij się, że zaktualizowałeś swoją lokalizację w aplikacji!"
-                    )
-                    
-                    return Response({'status': 'linked'})
-                
-                send_telegram_message(
-                    chat_id,
-                    "❌ <b>Nieprawidłowy lub wygasły kod.</b>\n\n"
-                    "Wygeneruj nowy kod w aplikacji i spróbuj ponownie."
-                )
-            
-            elif text == '/start':
-                send_telegram_message(
-                    chat_id,
-                    "👋 <b>Witaj w SkyGuard Bot!</b>\n\n"
-                    "Aby połączyć swoje konto:\n"
-                    "1. Otwórz aplikację SkyGuard\n"
-                    "2. Przejdź do zakładki Profile\n"
-                    "3. Kliknij 'Connect Telegram'\n"
-                    "4. Kliknij wygenerowany link lub skopiuj kod\n\n"
-                    "Po połączeniu będziesz otrzymywać powiadomienia o zagrożeniach!"
-                )
-        
-        return Response({'status': 'ok'})
\ No newline at end of file
+        return Response({'status': handle_update(request.data)})
@@ -60,11 +60,42 @@ const Home: React.FC = () => {
   useEffect(() => {
     fetchData();
     
-    const interval = setInterval(() => {
-      fetchData();
-    }, 5000);
+    // Live target feed: a snapshot on (re)connect, then only changes.
+    // Servers without streaming (runserver is WSGI) refuse the stream,
+    // the map then falls back to polling every 5 seconds.
+    let interval: ReturnType<typeof setInterval> | null = null;
+    const startPolling = () => {
+      if (interval === null) interval = setInterval(fetchData, 5000);
+    };
+    const stopPolling = () => {
+      if (interval !== null) clearInterval(interval);
+      interval = null;
+    };
+    const stream = new EventSource(`${api.defaults.baseURL}targets/stream/`);
+    const openTimeout = setTimeout(() => {
+      if (stream.readyState !== EventSource.OPEN) startPolling();
+    }, 10000);
+    stream.onopen = stopPolling;
+    stream.onerror = () => {
+      if (stream.readyState !== EventSource.OPEN) startPolling();
+    };
+    const upsertTarget = (e: MessageEvent) => {
+      const target: Target = JSON.parse(e.data);
+      setTargets(prev => [target, ...prev.filter(t => t.id !== target.id)]);
+    };
+    stream.addEventListener('snapshot', (e: MessageEvent) => setTargets(JSON.parse(e.data)));
+    stream.addEventListener('created', upsertTarget);
+    stream.addEventListener('updated', upsertTarget);
+    stream.addEventListener('resolved', (e: MessageEvent) => {
+      const { id } = JSON.parse(e.data);
+      setTargets(prev => prev.filter(t => t.id !== id));
+    });
     
-    return () => clearInterval(interval);
+    return () => {
+      clearTimeout(openTimeout);
+      stopPolling();
+      stream.close();
+    };
   }, []);
 
   useEffect(() => {